@@ -0,0 +1,337 @@
+'''
+Benchmarks of the hot paths of MLTools.
+
+Each benchmark runs on synthetic data of several sizes (number of rows) and records the median time of
+a few runs and the peak memory allocated (through tracemalloc, in a separate run). Results are saved as
+JSON, tagged with the current commit, and two result files can be compared.
+
+Usage:
+    python benchmarks/bench_hotpaths.py [--sizes 1e3,1e4,1e5] [--bench NAME ...] [--output FILE]
+    python benchmarks/bench_hotpaths.py --compare OLD.json NEW.json
+'''
+
+import argparse
+import gc
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+import tracemalloc
+
+from os import makedirs, path
+from time import perf_counter
+
+ROOT = path.dirname(path.dirname(path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np
+
+from generators import FakeSearch, integer_targets, ragged_matrices
+
+######################################
+#                                    #
+# BENCHMARKS                         #
+#                                    #
+######################################
+
+# each benchmark is: name ==> (maximum size, setup function)
+# the setup function receives the size and returns the function to measure (not timed)
+BENCHMARKS = {}
+
+def benchmark(name, max_size=10**7):
+    '''
+    Register a benchmark.
+
+    Required arguments:
+        name:     the name of the benchmark.
+
+    Optional arguments:
+        max_size: the largest size the benchmark runs on.
+    '''
+
+    def decorator(setup):
+        BENCHMARKS[name] = (max_size, setup)
+        return setup
+
+    return decorator
+
+@benchmark('ExtractTensor.transform', max_size=10**6)
+def _extract_tensor(size):
+
+    from mltools.libtransformer import ExtractTensor
+
+    data = ragged_matrices(size)
+
+    return lambda: ExtractTensor(flatten=True, shape=(12, 15)).transform(data)
+
+@benchmark('ExtractTensor.transform[arrow]', max_size=10**7)
+def _extract_tensor_arrow(size):
+
+    import pyarrow as pa
+
+    from mltools.libtransformer import ExtractTensor
+
+    # nested list array built from the buffers of the synthetic matrices
+    data    = ragged_matrices(size)
+    rows    = np.fromiter((m.shape[0] for m in data), dtype=np.int32, count=size)
+    cols    = np.concatenate([ np.full(m.shape[0], m.shape[1], dtype=np.int32) for m in data ])
+    values  = pa.array(np.concatenate([ m.ravel() for m in data ]))
+    inner   = pa.ListArray.from_arrays(pa.array(np.r_[0, np.cumsum(cols)].astype(np.int32)), values)
+    array   = pa.ListArray.from_arrays(pa.array(np.r_[0, np.cumsum(rows)].astype(np.int32)), inner)
+    del data
+
+    return lambda: ExtractTensor(flatten=True, shape=(12, 15)).transform(array)
+
+@benchmark('RemoveOutliers.transform')
+def _remove_outliers(size):
+
+    from mltools.libtransformer import RemoveOutliers
+
+    data = integer_targets(size)
+    rem  = RemoveOutliers(filter_dict={'h11': [1, 16], 'h21': [1, 86]})
+
+    return lambda: rem.transform(data)
+
+@benchmark('get_counts')
+def _get_counts(size):
+
+    from mltools.libplot import get_counts
+
+    data = integer_targets(size)
+
+    return lambda: list(get_counts(data, 'h11', 'num_cp'))
+
+@benchmark('Score.accuracy')
+def _score(size):
+
+    from mltools.libscore import Score
+
+    rng    = np.random.default_rng(0)
+    y_true = rng.integers(1, 20, size=size)
+    y_pred = y_true + rng.normal(scale=0.6, size=size)
+
+    return lambda: Score(y_true, y_pred, rounding=np.rint).accuracy()
+
+@benchmark('ViewCV.test_mean', max_size=10**5)
+def _view_cv(size):
+
+    from mltools.libscore import ViewCV
+
+    search = FakeSearch(size)
+
+    return lambda: ViewCV(search).test_mean()
+
+def _plot(draw):
+    '''
+    Build a function drawing on a new figure and saving it (PNG, in a temporary directory).
+    '''
+
+    import matplotlib
+    matplotlib.use('Agg') #--- no display
+
+    from mltools.libplot import Plot
+
+    directory = tempfile.mkdtemp(prefix='mltools-bench-')
+
+    def run():
+        plot = Plot()
+        draw(plot)
+        plot.save_and_close(path.join(directory, 'plot'), extension='png')
+
+    return run
+
+@benchmark('Plot.series2D', max_size=10**6)
+def _series2D(size):
+
+    data = np.random.default_rng(0).normal(size=size).cumsum()
+
+    return _plot(lambda plot: plot.series2D(data, binstep=0))
+
+@benchmark('Plot.scatter2D', max_size=10**5)
+def _scatter2D(size):
+
+    rng  = np.random.default_rng(0)
+    data = [rng.normal(size=size), rng.normal(size=size), rng.integers(1, 30, size=size)]
+
+    return _plot(lambda plot: plot.scatter2D(data))
+
+@benchmark('Plot.hist2D')
+def _hist2D(size):
+
+    data = integer_targets(size)['h11'].values
+
+    return _plot(lambda plot: plot.hist2D(data))
+
+@benchmark('Plot.matrix')
+def _matrix(size):
+
+    side = int(np.sqrt(size)) #--- size is the number of entries
+    data = np.corrcoef(np.random.default_rng(0).normal(size=(side, 64)))
+
+    return _plot(lambda plot: plot.matrix(data, resolution=256))
+
+######################################
+#                                    #
+# RUNNER                             #
+#                                    #
+######################################
+
+def measure(func, repeat=3):
+    '''
+    Measure the time and the peak memory of a function.
+
+    Required arguments:
+        func:   the function.
+
+    Optional arguments:
+        repeat: the number of timed runs.
+
+    Returns:
+        a dictionary with the median and minimum time (in s) and the peak memory allocated (in bytes).
+    '''
+
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = perf_counter()
+        func()
+        times.append(perf_counter() - start)
+
+    # measure the memory in a separate run (tracemalloc slows down the execution)
+    gc.collect()
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {'time': float(np.median(times)), 'min': min(times), 'peak': peak}
+
+def environment():
+    '''
+    Describe the environment of the benchmarks (commit, machine and versions).
+    '''
+
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                                cwd=ROOT,
+                                capture_output=True,
+                                text=True
+                               ).stdout.strip() or 'unknown'
+    except OSError:
+        commit = 'unknown'
+
+    versions = {}
+    for module in ['numpy', 'pandas', 'sklearn', 'matplotlib']:
+        try:
+            versions[module] = __import__(module).__version__
+        except ImportError:
+            versions[module] = None
+
+    return {'commit':   commit,
+            'machine':  platform.machine(),
+            'system':   platform.platform(),
+            'python':   platform.python_version(),
+            'versions': versions
+           }
+
+def run(names, sizes, repeat=3):
+    '''
+    Run the benchmarks.
+
+    Required arguments:
+        names:  the names of the benchmarks,
+        sizes:  the sizes of the data.
+
+    Optional arguments:
+        repeat: the number of timed runs.
+
+    Returns:
+        a dictionary of results: name ==> size ==> measurement.
+    '''
+
+    results = {}
+    for name in names:
+        max_size, setup = BENCHMARKS[name]
+        results[name]   = {}
+        for size in sizes:
+            if size > max_size:
+                continue
+            try:
+                func = setup(size)
+            except ImportError as err: #------------------------------- optional dependencies (e.g. PyArrow)
+                print('{:<32s} skipped ({})'.format(name, err), flush=True)
+                break
+            result                   = measure(func, repeat=repeat)
+            results[name][str(size)] = result
+            print('{:<32s} {:>10d} {:>12.4f} s {:>12.2f} MB'.format(name, size, result['time'], result['peak'] / 1024 / 1024),
+                  flush=True)
+
+    return results
+
+def compare(old, new, threshold=0.1):
+    '''
+    Print the ratio of the results of two runs.
+
+    Required arguments:
+        old:       the results of the reference run,
+        new:       the results of the new run.
+
+    Optional arguments:
+        threshold: the relative change flagged as a regression or improvement.
+
+    Returns:
+        the number of regressions.
+    '''
+
+    print('{} ({}) ==> {} ({})'.format(old['commit'], old['python'], new['commit'], new['python']))
+    print('{:<32s} {:>10s} {:>12s} {:>12s} {:>8s} {:>8s}'.format('benchmark', 'size', 'old [s]', 'new [s]', 'time', 'memory'))
+
+    regressions = 0
+    for name, sizes in new['results'].items():
+        for size, res in sizes.items():
+            ref = old['results'].get(name, {}).get(size)
+            if ref is None:
+                continue
+            time   = res['time'] / ref['time'] if ref['time'] > 0 else float('nan')
+            memory = res['peak'] / ref['peak'] if ref['peak'] > 0 else float('nan')
+            flag   = ''
+            if time > 1 + threshold or memory > 1 + threshold:
+                flag         = 'REGRESSION'
+                regressions += 1
+            elif time < 1 - threshold:
+                flag = 'faster'
+            print('{:<32s} {:>10s} {:>12.4f} {:>12.4f} {:>7.2f}x {:>7.2f}x {}'.format(
+                      name, size, ref['time'], res['time'], time, memory, flag))
+
+    return regressions
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Benchmarks of the hot paths of MLTools.')
+    parser.add_argument('--bench',   nargs='+', default=list(BENCHMARKS), choices=list(BENCHMARKS), metavar='NAME',
+                        help='benchmarks to run (default: all)')
+    parser.add_argument('--sizes',   default='1e3,1e4,1e5', help='comma separated sizes, from 1e3 to 1e7')
+    parser.add_argument('--repeat',  type=int, default=3, help='number of timed runs')
+    parser.add_argument('--output',  default=None, help='JSON file of the results (default: benchmarks/results/COMMIT.json)')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help='compare two result files')
+    args   = parser.parse_args()
+
+    if args.compare is not None:
+        with open(args.compare[0]) as f, open(args.compare[1]) as g:
+            return 1 if compare(json.load(f), json.load(g)) else 0
+
+    sizes  = [ int(float(s)) for s in args.sizes.split(',') ]
+    report = environment()
+    report['results'] = run(args.bench, sizes, repeat=args.repeat)
+
+    output = args.output or path.join(ROOT, 'benchmarks', 'results', report['commit'] + '.json')
+    makedirs(path.dirname(path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print('Results saved to', output)
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,116 @@
+'''
+Import-time benchmark of MLTools.
+
+Each module is imported in a fresh interpreter: the script reports the median import time and fails
+(exit status 1) if a module exceeds its time budget or loads a dependency it is supposed to defer.
+
+Usage:
+    python benchmarks/bench_import.py [--repeat N] [--scale S]
+'''
+
+import argparse
+import json
+import subprocess
+import sys
+
+from os import path
+
+# module ==> (time budget in ms, dependencies which must not be imported)
+BUDGETS = {'mltools':                (50,  ['numpy', 'matplotlib', 'pandas', 'sklearn', 'psutil']),
+           'mltools.liblog':         (50,  ['numpy', 'matplotlib', 'pandas', 'sklearn']),
+           'mltools.libos':          (100, ['numpy', 'matplotlib', 'pandas', 'sklearn']),
+           'mltools.libprof':        (50,  ['numpy', 'matplotlib', 'pandas', 'sklearn']),
+           'mltools.libplot':        (300, ['matplotlib', 'pandas', 'sklearn']),
+           'mltools.libscore':       (300, ['matplotlib', 'pandas', 'sklearn']),
+           'mltools.libtransformer': (3000, ['matplotlib'])
+          }
+
+# third-party dependencies: a module is skipped (not failed) only if one of them is not installed
+DEPENDENCIES = {'numpy', 'pandas', 'matplotlib', 'sklearn', 'psutil', 'joblib', 'scipy', 'pyarrow'}
+
+# code run in the child interpreter
+PROBE = '''
+import json, sys, time
+start = time.perf_counter()
+try:
+    import {module}
+except ModuleNotFoundError as err:
+    print(json.dumps({{'missing': err.name}}))
+    sys.exit(0)
+elapsed = time.perf_counter() - start
+print(json.dumps({{'time': elapsed * 1000, 'modules': sorted(m.split('.')[0] for m in sys.modules)}}))
+'''
+
+def measure(module, repeat=5):
+    '''
+    Measure the import time of a module in fresh interpreters.
+
+    Required arguments:
+        module: the name of the module.
+
+    Optional arguments:
+        repeat: the number of measurements.
+
+    Returns:
+        the median import time (in ms) and the set of top-level modules loaded, or None if a third-party
+        dependency is not installed.
+
+    Raises:
+        RuntimeError: if the import fails for any other reason (e.g. syntax errors or circular imports).
+    '''
+
+    root    = path.dirname(path.dirname(path.abspath(__file__)))
+    times   = []
+    modules = set()
+    for _ in range(repeat):
+        proc = subprocess.run([sys.executable, '-c', PROBE.format(module=module)],
+                              cwd=root,
+                              capture_output=True,
+                              text=True
+                             )
+        if proc.returncode != 0:
+            raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else 'exit status ' + str(proc.returncode))
+        result = json.loads(proc.stdout.strip().splitlines()[-1])
+        if 'missing' in result:
+            if (result['missing'] or '').split('.')[0] in DEPENDENCIES:
+                return None
+            raise RuntimeError('No module named ' + repr(result['missing']))
+        times.append(result['time'])
+        modules |= set(result['modules'])
+
+    return sorted(times)[len(times) // 2], modules
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Import-time benchmark of MLTools.')
+    parser.add_argument('--repeat', type=int,   default=5,   help='number of measurements per module')
+    parser.add_argument('--scale',  type=float, default=1.0, help='multiply the time budgets (slow machines)')
+    args   = parser.parse_args()
+
+    failures = []
+    for module, (budget, deferred) in BUDGETS.items():
+        try:
+            result = measure(module, repeat=args.repeat)
+        except RuntimeError as err:
+            failures.append(module)
+            print('{:<24s} FAILED ({})'.format(module, err))
+            continue
+        if result is None:
+            print('{:<24s} skipped (missing dependencies)'.format(module))
+            continue
+
+        elapsed, modules = result
+        loaded           = sorted(set(deferred) & modules)
+        status           = 'ok'
+        if budget is not None and elapsed > budget * args.scale:
+            status = 'SLOW (budget: {:d} ms)'.format(int(budget * args.scale))
+        if loaded:
+            status = 'EAGER (' + ', '.join(loaded) + ')'
+        if status != 'ok':
+            failures.append(module)
+        print('{:<24s} {:>8.1f} ms  {}'.format(module, elapsed, status))
+
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
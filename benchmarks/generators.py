@@ -0,0 +1,90 @@
+'''
+Synthetic data for the benchmarks of MLTools.
+
+All generators are deterministic given the seed, so that results are comparable across commits.
+'''
+
+import numpy  as np
+import pandas as pd
+
+def ragged_matrices(rows, shape=(12, 15), seed=0):
+    '''
+    Generate a column of matrices of different shapes (as stored in the datasets used with ExtractTensor).
+
+    Required arguments:
+        rows:  the number of rows.
+
+    Optional arguments:
+        shape: the maximum shape of the matrices,
+        seed:  the seed of the random generator.
+
+    Returns:
+        a Pandas series of NumPy arrays.
+    '''
+
+    rng    = np.random.default_rng(seed)
+    shapes = np.c_[rng.integers(1, shape[0] + 1, size=rows),
+                   rng.integers(1, shape[1] + 1, size=rows)]
+    values = rng.integers(0, 5, size=int(shapes.prod(axis=1).sum()))
+
+    # split a single buffer into the matrices (views, to keep the generation fast)
+    ends = np.cumsum(shapes.prod(axis=1))
+    data = np.empty(rows, dtype=object)
+    for i, (start, end) in enumerate(zip(np.r_[0, ends[:-1]], ends)):
+        data[i] = values[start:end].reshape(shapes[i])
+
+    return pd.Series(data, name='matrix')
+
+def integer_targets(rows, low=1, high=20, seed=0):
+    '''
+    Generate a dataset with integer targets and a feature (as used with RemoveOutliers and get_counts).
+
+    Required arguments:
+        rows: the number of rows.
+
+    Optional arguments:
+        low:  the smallest value of the targets,
+        high: the largest value of the targets,
+        seed: the seed of the random generator.
+
+    Returns:
+        a Pandas dataframe with the columns 'h11', 'h21' and 'num_cp'.
+    '''
+
+    rng = np.random.default_rng(seed)
+
+    return pd.DataFrame({'h11':    rng.integers(low, high + 1, size=rows),
+                         'h21':    rng.integers(low, 5 * high + 1, size=rows),
+                         'num_cp': rng.integers(1, 16, size=rows)
+                        })
+
+class FakeSearch:
+    '''
+    Object with the attributes of a fitted Scikit-learn search (e.g. GridSearchCV), used with ViewCV.
+    '''
+
+    def __init__(self, rows, folds=5, seed=0):
+        '''
+        Constructor of the class.
+
+        Required arguments:
+            rows:  the number of candidates (rows of the cross-validation results).
+
+        Optional arguments:
+            folds: the number of cross-validation folds,
+            seed:  the seed of the random generator.
+        '''
+
+        rng    = np.random.default_rng(seed)
+        params = [ {'alpha': float(a), 'l1_ratio': float(l)}
+                   for a, l in zip(rng.random(rows), rng.random(rows)) ]
+        scores = rng.random((folds, rows))
+
+        self.cv_results_ = {'params':          params,
+                            'mean_test_score': scores.mean(axis=0),
+                            'std_test_score':  scores.std(axis=0),
+                            'mean_fit_time':   rng.random(rows)
+                           }
+        for k in range(folds):
+            self.cv_results_['split' + str(k) + '_test_score'] = scores[k]
+        self.best_params_ = params[int(np.argmax(self.cv_results_['mean_test_score']))]
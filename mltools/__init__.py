@@ -0,0 +1,52 @@
+'''
+MLTools: a collection of tools for simple machine learning and data science projects.
+
+The public API is available from the top-level package, but the submodules (and their heavy
+dependencies: Matplotlib, Pandas, Scikit-learn) are only imported when a name is first used.
+'''
+
+from importlib import import_module
+
+# name of the object ==> submodule defining it
+_API = {'create_logfile':     'liblog',
+        'close_logfile':      'liblog',
+        'MetricsLog':         'liblog',
+        'read_metrics':       'liblog',
+        'InfoOS':             'libos',
+        'ResourceMonitor':    'libos',
+        'recommend':          'libos',
+        'tune':               'libos',
+        'profiled':           'libprof',
+        'section':            'libprof',
+        'get_counts':         'libplot',
+        'block_reduce':       'libplot',
+        'correlation_matrix': 'libplot',
+        'FigurePool':         'libplot',
+        'reset_figure':       'libplot',
+        'subplot_params':     'libplot',
+        'Plot':               'libplot',
+        'Score':              'libscore',
+        'ViewCV':             'libscore',
+        'accuracy':           'libscore',
+        'RemoveOutliers':     'libtransformer',
+        'ExtractTensor':      'libtransformer'
+       }
+
+__all__ = list(_API)
+
+def __getattr__(name):
+    '''
+    Import the submodule defining the requested object on first access.
+    '''
+
+    if name not in _API:
+        raise AttributeError('module ' + repr(__name__) + ' has no attribute ' + repr(name))
+
+    value = getattr(import_module('.' + _API[name], __name__), name)
+    globals()[name] = value #--- cache the object: later accesses do not go through __getattr__
+
+    return value
+
+def __dir__():
+
+    return sorted(set(globals()) | set(__all__))
@@ -1,50 +1,477 @@
+import atexit
+import gzip
+import json
 import logging
+import queue
+import re
+import shutil
+import sys
+import threading
+import time
+import warnings
+import weakref
 
-from os import path, rename
+from datetime import datetime, timezone
+from glob import escape, glob
+from logging.handlers import QueueHandler, QueueListener
+from os import path, remove, rename
 from time import strftime, gmtime
 
-def create_logfile(filename, name='logger', with_stdout=False, level=logging.INFO):
+# background listeners of the logs (stopped at exit)
+_listeners = {}
+
+# background compressions of rotated logs (joined at exit)
+_compressions = []
+
+# open metrics logs (their buffered records are written at exit)
+_metrics = weakref.WeakSet()
+
+# suffix of the rotated metrics logs (sortable by time) and its pattern
+ROTATION         = '_%Y%m%d.%H%M%S.%f'
+ROTATION_PATTERN = r'_(\d{8}\.\d{6}\.\d{6})(\.gz)?$'
+
+class BatchFileHandler(logging.FileHandler):
+    '''
+    File handler which flushes the stream once every few records instead of after each record.
+    '''
+
+    def __init__(self, filename, batch=64, **kwargs):
+        '''
+        Constructor of the class.
+
+        Required arguments:
+            filename: the name of the file.
+
+        Optional arguments:
+            batch:    the number of records written between two flushes,
+            **kwargs: additional arguments to pass to logging.FileHandler.
+        '''
+
+        super().__init__(filename, **kwargs)
+        self.batch   = batch
+        self.pending = 0
+
+    def emit(self, record):
+        '''
+        Write the record to the stream (flushing only when the batch is complete).
+        '''
+
+        try:
+            if self.stream is None:
+                self.stream = self._open()
+            self.stream.write(self.format(record) + self.terminator)
+            self.pending += 1
+            if self.pending >= self.batch:
+                self.flush()
+        except Exception:
+            self.handleError(record)
+
+    def flush(self):
+        '''
+        Flush the stream.
+        '''
+
+        super().flush()
+        self.pending = 0
+
+class BatchQueueListener(QueueListener):
+    '''
+    Queue listener which flushes its handlers whenever the queue is drained.
+    '''
+
+    def dequeue(self, block):
+        '''
+        Get a record from the queue, flushing the handlers before waiting for new records.
+        '''
+
+        try:
+            return self.queue.get_nowait()
+        except queue.Empty:
+            for handler in self.handlers:
+                handler.flush() #--- no more pending records: write the batch
+            return self.queue.get(block)
+
+def compress_file(filename, background=True):
+    '''
+    Compress a file with gzip (the compressed file is named filename.gz) and remove the original.
+
+    Required arguments:
+        filename:   the name of the file.
+
+    Optional arguments:
+        background: whether to compress the file in a background thread.
+
+    Returns:
+        the thread compressing the file (None if not in background).
+    '''
+
+    def _compress():
+        with open(filename, 'rb') as src, gzip.open(filename + '.gz.part', 'wb') as dst:
+            shutil.copyfileobj(src, dst, length=1 << 20)
+        rename(filename + '.gz.part', filename + '.gz') #--- never expose partially compressed files
+        remove(filename)
+
+    if not background:
+        _compress()
+        return None
+
+    thread = threading.Thread(target=_compress, name='compress:' + path.basename(filename))
+    thread.start()
+    _compressions[:] = [ t for t in _compressions if t.is_alive() ] + [thread]
+
+    return thread
+
+def create_logfile(filename, name='logger', with_stdout=False, level=logging.INFO, background=False, batch=64, compress=False):
     '''
     Create a logfile and rotate old logs.
-    
+
     Required arguments:
         filename:    the name of the file or path to the log.
-        
+
     Optional arguments
         name:        the name of the log session,
         with_stdout: whether to output the log also on stdout,
-        level:       the level of the information stored in the log.
-        
+        level:       the level of the information stored in the log,
+        background:  whether to write the records from a background thread (the caller only enqueues them),
+        batch:       the maximum number of records written between two flushes in background mode,
+        compress:    whether to compress the rotated log with gzip (in a background thread).
+
     Returns:
         the log.
     '''
-    
+
     # get current time to rename strings
     ctime = strftime('_%Y%m%d.%H%M%S', gmtime())
-    
+
     # rotate log if it already exists
     if path.isfile(filename):
         print('Rotating existing logs...', flush=True)
         rename(filename, filename + ctime)
-    
+        if compress:
+            compress_file(filename + ctime)
+
     # get a logging session by name
     log = logging.getLogger(name + ctime)
     log.setLevel(level)
-    
+
     # define format
     fmt = logging.Formatter('%(asctime)s: %(levelname)s ==> %(message)s')
-    
+
     # add the log file
-    han = logging.FileHandler(filename=filename)
+    handlers = []
+    han      = BatchFileHandler(filename=filename, batch=batch) if background else logging.FileHandler(filename=filename)
     han.setLevel(level)
     han.setFormatter(fmt)
-    log.addHandler(han)
-    
+    handlers.append(han)
+
     # add handler for standard output
     if with_stdout:
         std = logging.StreamHandler(sys.stdout)
         std.setLevel(level)
         std.setFormatter(fmt)
-        log.addHandler(std)
-        
+        handlers.append(std)
+
+    # route the records through a queue to a background thread
+    if background:
+        close_logfile(log) #-------------------------------------- stop a previous listener of the same log
+        que      = queue.SimpleQueue()
+        listener = BatchQueueListener(que, *handlers, respect_handler_level=True)
+        listener.start()
+        _listeners[log.name] = listener
+        handlers = [QueueHandler(que)]
+
+    for han in handlers:
+        log.addHandler(han)
+
     return log
+
+def close_logfile(log):
+    '''
+    Stop the background thread of a log (if any), writing all pending records, and close its handlers.
+
+    Required arguments:
+        log: the log.
+    '''
+
+    listener = _listeners.pop(log.name, None)
+    if listener is not None:
+        listener.stop() #------------------------------------------ process the remaining records
+        for han in listener.handlers:
+            han.close()
+
+    for han in list(log.handlers):
+        log.removeHandler(han)
+        han.close()
+
+class MetricsLog:
+    '''
+    Structured log of metrics: each record is a JSON object on a separate line (JSONL).
+
+    Records are buffered in memory and written in blocks. The file is rotated when it exceeds a given
+    size or age and the rotated files are compressed with gzip in a background thread.
+
+    E.g.:
+        with MetricsLog('train.jsonl') as metrics:
+            metrics.write(epoch=1, batch=10, loss=0.25)
+
+    Public methods:
+        write:  add a record to the log,
+        flush:  write the buffered records to file,
+        rotate: rotate (and compress) the current file,
+        close:  flush the records and close the file.
+    '''
+
+    def __init__(self, filename, buffer_size=256, max_bytes=None, max_time=None, compress=True, timestamp=True):
+        '''
+        Constructor of the class.
+
+        Required arguments:
+            filename:    the name of the file or path to the metrics log.
+
+        Optional arguments:
+            buffer_size: the number of records kept in memory before writing them,
+            max_bytes:   rotate the file when it exceeds this size (in bytes),
+            max_time:    rotate the file when it is older than this (in seconds),
+            compress:    whether to compress the rotated files,
+            timestamp:   whether to add the time of the record (key 'time').
+        '''
+
+        self.filename    = filename
+        self.buffer_size = buffer_size
+        self.max_bytes   = max_bytes
+        self.max_time    = max_time
+        self.compress    = compress
+        self.timestamp   = timestamp
+        self.buffer      = []
+        self.lock        = threading.Lock()
+
+        # rotate metrics if they already exist
+        if path.isfile(self.filename):
+            self.rotate()
+        self._open()
+        _metrics.add(self)
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, *args):
+
+        self.close()
+
+    def _open(self):
+
+        self.stream = open(self.filename, 'a', buffering=1 << 16)
+        self.opened = time.time()
+
+    def write(self, **metrics):
+        '''
+        Add a record to the log.
+
+        Optional arguments:
+            **metrics: the values of the metrics (numbers, strings, lists, NumPy scalars or arrays).
+        '''
+
+        if self.timestamp:
+            metrics.setdefault('time', time.time())
+        line = json.dumps(metrics, default=_to_json)
+
+        with self.lock:
+            self.buffer.append(line)
+            if len(self.buffer) < self.buffer_size:
+                return
+            self._flush()
+
+    def flush(self):
+        '''
+        Write the buffered records to file.
+        '''
+
+        with self.lock:
+            self._flush()
+
+    def _flush(self):
+
+        if self.buffer:
+            self.stream.write('\n'.join(self.buffer) + '\n')
+            self.buffer = []
+        self.stream.flush()
+
+        # rotate the file if too large or too old
+        if self.max_bytes is not None and self.stream.tell() >= self.max_bytes:
+            self._rotate()
+        elif self.max_time is not None and time.time() - self.opened >= self.max_time:
+            self._rotate()
+
+    def rotate(self):
+        '''
+        Rotate the current file (compressing it in background if requested).
+        '''
+
+        with self.lock:
+            if getattr(self, 'stream', None) is not None:
+                if self.buffer:
+                    self.stream.write('\n'.join(self.buffer) + '\n')
+                    self.buffer = []
+                self._rotate()
+            else:
+                self._rename() #--- file left by a previous run
+
+    def _rotate(self):
+
+        self.stream.close()
+        self._rename()
+        self._open()
+
+    def _rename(self):
+
+        ctime = datetime.now(timezone.utc).strftime(ROTATION) #--- sortable by time
+        rename(self.filename, self.filename + ctime)
+        if self.compress:
+            compress_file(self.filename + ctime)
+
+    def close(self):
+        '''
+        Write the buffered records to file and close it.
+        '''
+
+        with self.lock:
+            if self.stream.closed:
+                return
+            if self.buffer:
+                self.stream.write('\n'.join(self.buffer) + '\n')
+                self.buffer = []
+            self.stream.close()
+
+def _to_json(obj):
+    '''
+    Convert NumPy scalars and arrays (or any object with a tolist method) to JSON types.
+    '''
+
+    if hasattr(obj, 'tolist'):
+        return obj.tolist()
+
+    raise TypeError('Object of type ' + type(obj).__name__ + ' is not JSON serializable')
+
+def _read_lines(filename):
+    '''
+    Read the non-empty lines of a (possibly gzip-compressed) file.
+
+    If the file has been compressed (and removed) in the meantime, the compressed file is read instead.
+
+    Required arguments:
+        filename: the name of the file.
+
+    Returns:
+        the list of lines (empty if the file does not exist).
+    '''
+
+    candidates = [filename] if filename.endswith('.gz') else [filename, filename + '.gz']
+    for f in candidates:
+        opener = gzip.open if f.endswith('.gz') else open
+        try:
+            with opener(f, 'rt') as stream:
+                return [ l for l in stream.read().splitlines() if l ]
+        except FileNotFoundError:
+            continue
+
+    return []
+
+def _decode_lines(filename, lines):
+    '''
+    Decode the lines of a file one by one, skipping an incomplete last line.
+
+    Required arguments:
+        filename: the name of the file (for the warning),
+        lines:    the lines of the file.
+
+    Returns:
+        the list of records.
+    '''
+
+    records = []
+    for i, line in enumerate(lines):
+        try:
+            records.append(json.loads(line))
+        except json.JSONDecodeError:
+            if i < len(lines) - 1:
+                raise #----------------------------------------------------- corrupted file, not an interrupted write
+            warnings.warn('Skipping the incomplete last line of ' + filename + '.')
+
+    return records
+
+def read_metrics(filename, as_frame=True):
+    '''
+    Read the metrics of a run, including the rotated (and compressed) files, in chronological order.
+
+    Required arguments:
+        filename: the name of the file or path to the metrics log.
+
+    Optional arguments:
+        as_frame: whether to return a Pandas dataframe (otherwise a dictionary of NumPy arrays).
+
+    Returns:
+        the metrics (missing values are NaN in numerical columns and None otherwise).
+
+    An incomplete last line of a file (e.g. left by a crash while writing a block) is skipped with a warning.
+    '''
+
+    # select only the files rotated from this log (not other logs sharing the prefix)
+    pattern = re.compile(re.escape(path.basename(filename)) + ROTATION_PATTERN)
+    rotated = {}
+    for f in glob(escape(filename) + '_*'):
+        match = pattern.match(path.basename(f))
+        if match is None:
+            continue
+        if match.group(1) not in rotated or match.group(2) is None:
+            rotated[match.group(1)] = f #--------------------------------- prefer the file being compressed
+    files = [ rotated[k] for k in sorted(rotated) ]
+    files.append(filename)
+
+    # parse all lines at once (much faster than decoding each line separately)
+    records = []
+    for f in files:
+        lines = _read_lines(f)
+        if not lines:
+            continue
+        try:
+            records.extend(json.loads('[' + ','.join(lines) + ']'))
+        except json.JSONDecodeError:
+            records.extend(_decode_lines(f, lines))
+
+    # build the columns
+    keys = {}
+    for rec in records:
+        for k in rec:
+            keys.setdefault(k, None) #--- keep the order of first appearance
+    columns = { k: [ rec.get(k) for rec in records ] for k in keys }
+
+    if as_frame:
+        import pandas as pd
+
+        return pd.DataFrame(columns)
+
+    import numpy as np
+
+    arrays = {}
+    for k, values in columns.items():
+        if all(v is None or isinstance(v, (int, float)) for v in values):
+            arrays[k] = np.array([ np.nan if v is None else v for v in values ])
+        else:
+            arrays[k] = np.array(values, dtype=object)
+
+    return arrays
+
+@atexit.register
+def _close_listeners():
+    '''
+    Flush and stop all background listeners, close the metrics logs and wait for the compression of rotated
+    logs at exit.
+    '''
+
+    for name in list(_listeners):
+        close_logfile(logging.getLogger(name))
+    for metrics in list(_metrics):
+        metrics.close()
+    for thread in _compressions:
+        thread.join()
@@ -1,33 +1,563 @@
+import logging
+import math
 import os
 import psutil
+import sys
+import threading
+import time
+
+from collections import deque, namedtuple
+from contextlib import contextmanager
+
+from .libprof import nrows
+
+# root of the cgroup hierarchy (used when the mount points cannot be read)
+CGROUP = '/sys/fs/cgroup'
+
+# process information (cgroups of the process and mount points)
+PROC = '/proc/self'
+
+def _cgroup_mounts():
+    '''
+    Read the mount points of the cgroup hierarchies.
+
+    Returns:
+        a list of (root of the mount in the hierarchy, mount point, version, controllers).
+    '''
+
+    mounts = []
+    try:
+        with open(os.path.join(PROC, 'mountinfo')) as f:
+            for line in f:
+                fields, _, tail = line.partition(' - ') #------------------ optional fields end with "-"
+                fields, tail    = fields.split(), tail.split()
+                if len(fields) < 5 or len(tail) < 3 or tail[0] not in ('cgroup', 'cgroup2'):
+                    continue
+                mounts.append((fields[3], fields[4], 2 if tail[0] == 'cgroup2' else 1, tail[2].split(',')))
+    except OSError:
+        pass
+
+    return mounts
+
+def _cgroup_dirs(controller):
+    '''
+    Find the directories of the cgroups of the process, from its own cgroup up to the root of the mount.
+
+    Limits apply at every level of the hierarchy: the tightest one is the effective limit.
+
+    Required arguments:
+        controller: the cgroup v1 controller (e.g. "cpu" or "memory").
+
+    Returns:
+        a list of (version, directory).
+    '''
+
+    try:
+        with open(os.path.join(PROC, 'cgroup')) as f:
+            lines = f.read().splitlines()
+    except OSError:
+        lines = ['0::/', '1:' + controller + ':/']
+    mounts = _cgroup_mounts() or [('/', CGROUP, 2, []), ('/', os.path.join(CGROUP, controller), 1, [controller])]
+
+    dirs = []
+    for line in lines:
+        hierarchy, _, line = line.partition(':') #------------------------- "id:controllers:path"
+        names, _, path     = line.partition(':')
+        version            = 2 if hierarchy == '0' and names == '' else 1
+        if version == 1 and controller not in names.split(','):
+            continue
+        for root, mount, mversion, options in mounts:
+            if mversion != version or (version == 1 and controller not in options):
+                continue
+            relative  = path[len(root):] if path.startswith(root) else '' #--- the mount may be a subtree (e.g. in containers)
+            mount     = os.path.normpath(mount)
+            directory = os.path.normpath(os.path.join(mount, relative.lstrip('/')))
+            if os.path.commonpath([mount, directory]) != mount: #---------- e.g. "/.." outside of the namespace
+                directory = mount
+            while True:
+                dirs.append((version, directory))
+                if directory == mount:
+                    break
+                directory = os.path.dirname(directory)
+            break
+
+    return dirs
+
+def _read_cgroup(directory, name):
+    '''
+    Read a file of the cgroup hierarchy.
+
+    Required arguments:
+        directory: the directory of the cgroup,
+        name:      the name of the file.
+
+    Returns:
+        the content of the file (None if it does not exist).
+    '''
+
+    try:
+        with open(os.path.join(directory, name)) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+def cgroup_cpus():
+    '''
+    Compute the number of CPUs allowed by the CPU quota of the cgroups of the process (e.g. a container).
+
+    Returns:
+        the (fractional) number of CPUs (None if there is no quota).
+    '''
+
+    quotas = []
+    for version, directory in _cgroup_dirs('cpu'):
+        if version == 2:
+            value = _read_cgroup(directory, 'cpu.max') #------------------- "quota period"
+            if value is None:
+                continue
+            quota, _, period = value.partition(' ')
+            if quota != 'max':
+                quotas.append(int(quota) / int(period or 100000))
+        else:
+            quota  = _read_cgroup(directory, 'cpu.cfs_quota_us')
+            period = _read_cgroup(directory, 'cpu.cfs_period_us')
+            if quota is not None and period is not None and int(quota) > 0: #--- -1 if unlimited
+                quotas.append(int(quota) / int(period))
+
+    return min(quotas) if quotas else None
+
+def cgroup_memory():
+    '''
+    Read the memory limit and usage of the cgroups of the process (e.g. a container).
+
+    Returns:
+        the tightest limit and the current usage of the same cgroup (in bytes), or None if there is no limit.
+    '''
+
+    memory = None
+    for version, directory in _cgroup_dirs('memory'):
+        if version == 2:
+            limit, usage = 'memory.max', 'memory.current'
+        else:
+            limit, usage = 'memory.limit_in_bytes', 'memory.usage_in_bytes'
+        limit = _read_cgroup(directory, limit)
+        if limit is None or limit == 'max':
+            continue
+        if memory is None or int(limit) < memory[0]:
+            usage  = _read_cgroup(directory, usage)
+            memory = (int(limit), int(usage) if usage is not None else 0)
+
+    if memory is None or memory[0] >= psutil.virtual_memory().total: #---- v1 reports a huge number if unlimited
+        return None
+
+    return memory
 
 class InfoOS:
     '''
     This class retrieves and prints information on the current OS.
-    
+
+    CPU and memory take into account the CPU affinity of the process and the limits of its cgroup
+    (e.g. in a container): the totals of the host are kept separately.
+
     Public methods:
-    
+        monitor: create a background monitor of the resources used by the current process.
+
     Attributes:
-        os:      the current OS,
-        kernel:  the current release,
-        arch:    the current architecture,
-        threads: the number of available CPU threads,
-        freq:    the current CPU frequency,
-        freqm:   the maximum CPU frequency,
-        vmtot:   the total virtual memory (in MB),
-        vmav:    the available virtual memory (in MB).
-    '''
-    
+        os:           the current OS,
+        kernel:       the current release,
+        arch:         the current architecture,
+        threads:      the number of available CPU threads,
+        freq:         the current CPU frequency,
+        freqm:        the maximum CPU frequency,
+        vmtot:        the total virtual memory (in MB),
+        vmav:         the available virtual memory (in MB),
+        host_threads: the number of CPU threads of the host,
+        host_vmtot:   the total virtual memory of the host (in MB).
+    '''
+
     def __init__(self):
         '''
         Constructor of the class.
         '''
-        
-        self.os      = os.uname().sysname
-        self.kernel  = os.uname().release
-        self.arch    = os.uname().machine
-        self.threads = psutil.cpu_count()
-        self.freq    = psutil.cpu_freq().current
-        self.freqm   = psutil.cpu_freq().max
-        self.vmtot   = int(psutil.virtual_memory().total / 1024 / 1024)
-        self.vmav    = int(psutil.virtual_memory().available / 1024 / 1024)
+
+        uname = os.uname() #--------------------------------- query the system only once
+        freq  = psutil.cpu_freq() #-------------------------- not available on all systems
+        vmem  = psutil.virtual_memory()
+
+        self.os           = uname.sysname
+        self.kernel       = uname.release
+        self.arch         = uname.machine
+        self.host_threads = psutil.cpu_count()
+        self.freq         = freq.current if freq is not None else None
+        self.freqm        = freq.max if freq is not None else None
+        self.host_vmtot   = int(vmem.total / 1024 / 1024)
+
+        # CPU threads usable by the process
+        threads = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else self.host_threads
+        quota   = cgroup_cpus()
+        if quota is not None:
+            threads = min(threads, max(1, math.floor(quota)))
+        self.threads = threads
+
+        # memory usable by the process
+        total  = vmem.total
+        avail  = vmem.available
+        memory = cgroup_memory()
+        if memory is not None:
+            limit, usage = memory
+            total        = min(total, limit)
+            avail        = min(avail, max(limit - usage, 0))
+        self.vmtot = int(total / 1024 / 1024)
+        self.vmav  = int(avail / 1024 / 1024)
+
+    def monitor(self, interval=1.0, size=3600, pid=None):
+        '''
+        Create a background monitor of the resources used by a process.
+
+        Optional arguments:
+            interval: the time between two samples (in s),
+            size:     the maximum number of samples kept (older samples are discarded),
+            pid:      the id of the process (default: the current process).
+
+        Returns:
+            the monitor (not started).
+        '''
+
+        return ResourceMonitor(interval=interval, size=size, pid=pid)
+
+# a sample of the resources used by a process (memory in MB, I/O in bytes, frequency in MHz)
+# peak is the high-water mark of the RSS kept by the OS (the largest sample if not available)
+Sample = namedtuple('Sample', ['time', 'stage', 'rss', 'peak', 'cpu', 'cores', 'read', 'write', 'freq'])
+
+def _peak_rss(process, memory):
+    '''
+    Read the high-water mark of the resident memory of a process, which includes the peaks between samples.
+
+    Required arguments:
+        process: the process (psutil),
+        memory:  its memory information (psutil).
+
+    Returns:
+        the peak memory (in bytes, None if not available).
+    '''
+
+    peak = getattr(memory, 'peak_wset', None) #------------------------------ Windows
+    if peak is not None:
+        return peak
+
+    try:
+        with open(os.path.join('/proc', str(process.pid), 'status')) as f: #--- Linux
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+
+    if process.pid == os.getpid():
+        try:
+            import resource
+        except ImportError:
+            return None
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024 #------------ bytes on macOS, kB elsewhere
+
+    return None
+
+class ResourceMonitor(threading.Thread):
+    '''
+    Thread sampling the resources used by a process at regular intervals into a ring buffer.
+
+    Samples can be tagged with the current stage of the pipeline, to see which step drives the peak memory.
+
+    E.g.:
+        with InfoOS().monitor(interval=0.5) as mon:
+            with mon.stage('load'):
+                ...
+            with mon.stage('fit'):
+                ...
+        mon.to_frame()
+
+    Public methods:
+        stage:     context manager tagging the samples taken during a block of code,
+        set_stage: tag the following samples,
+        sample:    take a sample immediately,
+        stop:      stop the monitor,
+        samples:   return the samples in the buffer,
+        peaks:     return the peak memory of each stage,
+        to_frame:  return the samples as a Pandas dataframe,
+        dump:      write a summary of each stage to a log.
+    '''
+
+    def __init__(self, interval=1.0, size=3600, pid=None):
+        '''
+        Constructor of the class.
+
+        Optional arguments:
+            interval: the time between two samples (in s),
+            size:     the maximum number of samples kept (older samples are discarded),
+            pid:      the id of the process (default: the current process).
+        '''
+
+        super().__init__(name='ResourceMonitor', daemon=True)
+
+        self.interval = interval
+        self.process  = psutil.Process(pid)
+        self.buffer   = deque(maxlen=size)
+        self.peak     = 0.0
+        self.stages   = {} #------------------------------ peak memory of each stage (kept when samples are discarded)
+        self.hwm      = 0.0 #----------------------------- high-water mark at the last sample
+        self.current  = None
+        self.lock     = threading.Lock()
+        self.stopped  = threading.Event()
+
+        # initialise the counters of the CPU utilisation and the high-water mark (peaks before the monitor are not staged)
+        self.process.cpu_percent(None)
+        psutil.cpu_percent(None, percpu=True)
+        try:
+            self.hwm = (_peak_rss(self.process, self.process.memory_info()) or 0) / 1024 / 1024
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            pass
+
+    def __enter__(self):
+
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+
+        self.stop()
+
+    def run(self):
+        '''
+        Sample the resources until the monitor is stopped.
+        '''
+
+        while not self.stopped.is_set():
+            self.sample()
+            self.stopped.wait(self.interval)
+
+    def stop(self):
+        '''
+        Stop the monitor (a last sample is taken).
+        '''
+
+        self.stopped.set()
+        if self.is_alive():
+            self.join()
+        self.sample()
+
+    def set_stage(self, name):
+        '''
+        Tag the following samples with the name of a stage.
+
+        Required arguments:
+            name: the name of the stage (None to remove the tag).
+        '''
+
+        self.sample() #------------------------------------ close the previous stage with a sample
+        with self.lock:
+            self.current = name
+
+    @contextmanager
+    def stage(self, name):
+        '''
+        Tag the samples taken during a block of code.
+
+        Required arguments:
+            name: the name of the stage.
+        '''
+
+        previous = self.current
+        self.set_stage(name)
+        try:
+            yield self
+        finally:
+            self.set_stage(previous)
+
+    def sample(self):
+        '''
+        Take a sample of the resources.
+
+        Returns:
+            the sample.
+        '''
+
+        try:
+            with self.process.oneshot():
+                memory = self.process.memory_info()
+                rss    = memory.rss / 1024 / 1024
+                hwm    = (_peak_rss(self.process, memory) or 0) / 1024 / 1024
+                cpu    = self.process.cpu_percent(None)
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            return None
+        try:
+            io = self.process.io_counters() if hasattr(self.process, 'io_counters') else None
+        except (psutil.NoSuchProcess, psutil.AccessDenied): #--- e.g. processes of other users or restricted /proc
+            io = None
+        freq = psutil.cpu_freq()
+
+        with self.lock:
+            high      = hwm if hwm > self.hwm else rss #--- a new high-water mark was reached since the last sample
+            self.hwm  = max(self.hwm, hwm)
+            self.peak = max(self.peak, rss, hwm)
+            stage     = self.current
+            sample    = Sample(time=time.time(),
+                               stage=stage,
+                               rss=rss,
+                               peak=self.peak,
+                               cpu=cpu,
+                               cores=tuple(psutil.cpu_percent(None, percpu=True)),
+                               read=io.read_bytes if io is not None else None,
+                               write=io.write_bytes if io is not None else None,
+                               freq=freq.current if freq is not None else None
+                              )
+            self.buffer.append(sample)
+            self.stages[stage] = max(self.stages.get(stage, 0.0), rss, high)
+
+        return sample
+
+    def samples(self):
+        '''
+        Returns:
+            the list of samples in the buffer.
+        '''
+
+        with self.lock:
+            return list(self.buffer)
+
+    def peaks(self):
+        '''
+        Returns:
+            a dictionary with the peak memory (in MB) of each stage.
+        '''
+
+        with self.lock:
+            return dict(self.stages)
+
+    def to_frame(self):
+        '''
+        Returns:
+            a Pandas dataframe with the samples (one column per CPU core: cpu0, cpu1, ...).
+        '''
+
+        import pandas as pd #--- imported on first use
+
+        samples = self.samples()
+        df      = pd.DataFrame([ s._asdict() for s in samples ], columns=Sample._fields)
+        cores   = pd.DataFrame([ s.cores for s in samples ], index=df.index).add_prefix('cpu')
+
+        return pd.concat([df.drop(columns='cores'), cores], axis=1)
+
+    def dump(self, log, level=logging.INFO):
+        '''
+        Write a summary of each stage to a log (e.g. created by create_logfile).
+
+        Required arguments:
+            log:   the log.
+
+        Optional arguments:
+            level: the level of the records.
+        '''
+
+        samples = self.samples()
+        for stage, peak in self.peaks().items():
+            cpu = [ s.cpu for s in samples if s.stage == stage ]
+            log.log(level,
+                    'stage {}: peak RSS {:.1f} MB, mean CPU {:.1f}% ({:d} samples)'.format(
+                        stage,
+                        peak,
+                        sum(cpu) / len(cpu) if cpu else 0.0,
+                        len(cpu)
+                       )
+                   )
+        log.log(level, 'peak RSS {:.1f} MB'.format(self.peak))
+
+def footprint(X, sample=1000):
+    '''
+    Estimate the memory used by each row of a dataset from a sample of rows.
+
+    Required arguments:
+        X:      the dataset (dataframe, series or array).
+
+    Optional arguments:
+        sample: the number of rows in the sample.
+
+    Returns:
+        the memory of a row (in bytes).
+    '''
+
+    head = X.iloc[:sample] if hasattr(X, 'iloc') else X[:sample]
+    size = nrows(head)
+    if not size:
+        return 0.0
+
+    if hasattr(head, 'memory_usage'):
+        usage = head.memory_usage(index=False, deep=True) #--- includes the arrays in object columns
+        usage = usage.sum() if hasattr(usage, 'sum') else usage
+    else:
+        usage = getattr(head, 'nbytes', 0)
+
+    return float(usage) / size
+
+def recommend(row_bytes, rows=None, info=None, memory_fraction=0.5, overhead=4.0):
+    '''
+    Recommend the number of workers and the size of the chunks of a job from the available resources.
+
+    Required arguments:
+        row_bytes:       the memory used by a row of the input (in bytes).
+
+    Optional arguments:
+        rows:            the number of rows of the input,
+        info:            the InfoOS object describing the resources (default: the current resources),
+        memory_fraction: the fraction of the available memory the job may use,
+        overhead:        the memory of the temporaries of a row relative to the input (e.g. padding and stacking).
+
+    Returns:
+        a dictionary with the number of workers (n_jobs) and the number of rows in each chunk (chunk_size).
+    '''
+
+    info    = info if info is not None else InfoOS()
+    budget  = info.vmav * 1024 * 1024 * memory_fraction
+    n_jobs  = max(1, info.threads)
+    per_row = max(row_bytes * overhead, 1.0)
+    chunk   = max(1, int(budget / (n_jobs * per_row))) #--- all workers hold a chunk at the same time
+
+    if rows:
+        chunk  = min(chunk, max(1, math.ceil(rows / n_jobs))) #--- use all workers on small inputs
+        n_jobs = min(n_jobs, math.ceil(rows / chunk))
+
+    return {'n_jobs': n_jobs, 'chunk_size': chunk}
+
+def tune(estimator, X, apply=True, **kwargs):
+    '''
+    Tune the number of workers and the size of the chunks of an estimator (e.g. ExtractTensor).
+
+    Only the parameters of the estimator are set: nothing is recommended for estimators without n_jobs and
+    chunk_size (e.g. RemoveOutliers, whose memory is the mask and the filtered copy of the dataset).
+
+    Arrow and Parquet input are processed one chunk (or row group) at a time by the estimators, which ignore
+    these parameters: nothing is recommended for them.
+
+    Required arguments:
+        estimator: the estimator (with n_jobs and/or chunk_size parameters),
+        X:         the input of the estimator.
+
+    Optional arguments:
+        apply:     whether to set the parameters of the estimator,
+        **kwargs:  additional arguments to pass to recommend.
+
+    Returns:
+        the recommended parameters supported by the estimator.
+    '''
+
+    from .libtransformer import is_arrow, is_parquet
+
+    if is_arrow(X) or is_parquet(X):
+        return {}
+
+    params = recommend(footprint(X), rows=nrows(X), **kwargs)
+    params = { k: v for k, v in params.items() if k in estimator.get_params() }
+    if apply:
+        estimator.set_params(**params)
+
+    return params
@@ -1,7 +1,12 @@
-import numpy             as np
-import matplotlib        as mpl
-import matplotlib.pyplot as plt
+import numpy as np
 
+from collections import OrderedDict
+
+from .libprof import nrows, profiled
+
+# Matplotlib is imported in the functions which need it, to keep the import of the module fast.
+
+@profiled(rows=0)
 def get_counts(df, label, feature):
     '''
     Generator to produce the count of unique occurrencies of the data.
@@ -21,7 +26,210 @@ def get_counts(df, label, feature):
         
         for u, c in np.c_[uniques, counts]:
             yield np.array([ n, u, c ])
+
+def block_reduce(data, resolution, aggregate='mean'):
+    '''
+    Aggregate blocks of a matrix to reduce it to (at most) a given resolution.
+
+    Required arguments:
+        data:       the matrix to reduce,
+        resolution: the maximum number of entries per side of the reduced matrix.
+
+    Optional arguments:
+        aggregate:  the aggregation function of the blocks ('mean', 'max', 'min' or 'absmax').
+
+    Returns:
+        the reduced matrix (the original matrix if already smaller than the resolution).
+    '''
+
+    functions = {'mean':   np.nanmean,
+                 'max':    np.nanmax,
+                 'min':    np.nanmin,
+                 'absmax': lambda m, axis: np.nanmax(np.abs(m), axis=axis)
+                }
+    if aggregate not in functions:
+        raise ValueError('Unknown aggregation: ' + str(aggregate) + '. Use one of ' + str(list(functions)) + '.')
+
+    data       = np.asarray(data, dtype=float)
+    rows, cols = np.shape(data)
+    brows      = int(np.ceil(rows / resolution)) #------------------------ rows in each block
+    bcols      = int(np.ceil(cols / resolution)) #------------------------ columns in each block
+    if brows <= 1 and bcols <= 1:
+        return data
+
+    # pad with NaN to a multiple of the block size (the padding is ignored by the aggregation)
+    nblocks = int(np.ceil(rows / brows))
+    mblocks = int(np.ceil(cols / bcols))
+    padded  = np.full((nblocks * brows, mblocks * bcols), np.nan)
+    padded[:rows, :cols] = data
+
+    return functions[aggregate](padded.reshape(nblocks, brows, mblocks, bcols), axis=(1, 3))
+
+def correlation_matrix(data, chunk_size=65536):
+    '''
+    Compute the correlation matrix of the columns of a (samples, features) array in chunks of rows.
+
+    The array is never loaded as a whole: the means and the centred products of the chunks are merged
+    pairwise, which stays accurate when the means of the features are large compared to their spread.
+
+    Required arguments:
+        data:       the array (or the path of a .npy file, opened as a memory map).
+
+    Optional arguments:
+        chunk_size: the number of rows processed at once.
+
+    Returns:
+        the correlation matrix of the features.
+    '''
+
+    if isinstance(data, str):
+        data = np.load(data, mmap_mode='r') #------------------------------- open the file without reading it
+
+    samples, features = np.shape(data)
+    count             = 0
+    mean              = np.zeros(features)
+    products          = np.zeros((features, features)) #-------------------- centred sum of the products
+    for start in range(0, samples, chunk_size):
+        chunk     = np.asarray(data[start:start + chunk_size], dtype=np.float64)
+        size      = chunk.shape[0]
+        cmean     = chunk.mean(axis=0)
+        centred   = chunk - cmean
+        delta     = cmean - mean
+
+        # merge the statistics of the chunk (Chan et al.)
+        products += centred.T @ centred + np.outer(delta, delta) * count * size / (count + size)
+        mean     += delta * size / (count + size)
+        count    += size
+
+    cov  = products / samples
+    std  = np.sqrt(np.clip(np.diag(cov), 0.0, None))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        corr = cov / np.outer(std, std) #----------------------------------- constant features give NaN
+
+    return np.clip(corr, -1.0, 1.0)
+
+class FigurePool:
+    '''
+    This is a bounded pool of figures and axes, reused by Plot to avoid building new Matplotlib objects.
+    
+    Figures are keyed by (rows, columns, width, height): the least recently used ones are discarded when
+    the pool exceeds its size. Pooled figures are not registered with pyplot, hence they are neither
+    shown nor closed by plt.show() and plt.close('all').
+    
+    Public methods:
+        acquire: get a cleared figure and its axes (new ones are created if none is available),
+        release: return a figure to the pool,
+        clear:   discard all the figures in the pool.
+    '''
+    
+    def __init__(self, size=8):
+        '''
+        Constructor of the class.
+        
+        Optional arguments:
+            size: the maximum number of figures kept in the pool.
+        '''
+        
+        self.size    = size
+        self.figures = OrderedDict()
+        
+    def __len__(self):
+        
+        return len(self.figures)
+        
+    def acquire(self, rows=1, columns=1, width=6, height=5):
+        '''
+        Get a figure and its axes from the pool.
+        
+        Optional arguments:
+            rows:    the number of rows in the figure,
+            columns: the number of columns in the figure,
+            width:   the width of one plot,
+            height:  the height of one plot.
             
+        Returns:
+            the figure, the axes, their original subplot specifications and subplot parameters.
+        '''
+        
+        key = (rows, columns, width, height)
+        if key in self.figures:
+            return self.figures.pop(key) #--- reuse an existing figure (no longer available to others)
+        
+        from matplotlib.figure import Figure
+        
+        figure = Figure(figsize=(width * columns,
+                                 height * rows)
+                       ) #----------------------- create a new figure (outside pyplot)
+        axes   = figure.subplots(rows, columns)
+        specs  = [ ax.get_subplotspec() for ax in np.ravel(axes) ]
+        params = subplot_params(figure)
+        
+        return figure, axes, specs, params
+    
+    def release(self, key, figure, axes, specs, params):
+        '''
+        Clear a figure and return it to the pool.
+        
+        Required arguments:
+            key:    the key of the figure (rows, columns, width, height),
+            figure: the figure,
+            axes:   the axes of the figure,
+            specs:  the original subplot specifications of the axes,
+            params: the original subplot parameters of the figure.
+        '''
+        
+        if key in self.figures:
+            self.figures.move_to_end(key) #---------------------- keep only one figure per key
+            return
+        
+        reset_figure(figure, axes, specs, params) #-------------- remove the artists
+        self.figures[key] = (figure, axes, specs, params)
+        while len(self.figures) > self.size:
+            self.figures.popitem(last=False) #------------------- evict the least recently used figure
+            
+    def clear(self):
+        '''
+        Discard all the figures in the pool.
+        '''
+        
+        self.figures.clear()
+        
+def subplot_params(figure):
+    '''
+    Get the subplot parameters of a figure (modified by the tight layout).
+    
+    Required arguments:
+        figure: the figure.
+        
+    Returns:
+        the dictionary of the parameters (to pass to figure.subplots_adjust).
+    '''
+    
+    pars = figure.subplotpars
+    
+    return {'left': pars.left, 'right': pars.right, 'bottom': pars.bottom, 'top': pars.top, 'wspace': pars.wspace, 'hspace': pars.hspace}
+
+def reset_figure(figure, axes, specs, params):
+    '''
+    Remove all artists from a figure, keeping the figure, the axes and the canvas.
+    
+    Required arguments:
+        figure: the figure,
+        axes:   the axes of the figure,
+        specs:  the original subplot specifications of the axes,
+        params: the original subplot parameters of the figure.
+    '''
+    
+    axes = list(np.ravel(axes))
+    for ax in list(figure.axes):
+        if not any(ax is a for a in axes):
+            ax.remove() #------------------------------------ remove additional axes (e.g. colour bars)
+    figure.subplots_adjust(**params) #---------------------- undo the tight layout (it would add up on each reuse)
+    for ax, spec in zip(axes, specs):
+        ax.clear() #----------------------------------------- remove the artists
+        ax.set_subplotspec(spec) #--------------------------- restore the space taken by colour bars
+        ax.set_position(spec.get_position(figure))
+
 class Plot:
     '''
     This is a class to plot various kinds of data in their proper format using a unified interface.
@@ -31,7 +239,8 @@ class Plot:
     
         General:
             save:           save the current figure to file (default format: pdf),
-            close:          close the current figure,
+            reset:          remove the plots from the current figure (keeping figure and axes),
+            close:          close the current figure (or return it to the pool),
             save_and_close: save the current figure to file and close it (default format: pdf).
             
         Plots:
@@ -46,7 +255,8 @@ class Plot:
                  rows=1,
                  columns=1,
                  width=6,
-                 height=5
+                 height=5,
+                 pool=None
                 ):
         '''
         Constructor of the class.
@@ -56,14 +266,26 @@ class Plot:
             columns: the number of columns in the figure,
             width:   the width of one plot,
             height:  the height of one plot.
+            
+        Optional arguments:
+            pool:    a FigurePool used to reuse figures and axes across plots.
         '''
         
         # initialization
-        self.figure, self.axes = plt.subplots(rows,
-                                              columns,
-                                              figsize=(width * columns,
-                                                       height * rows)
-                                             )
+        self.pool = pool
+        self.key  = (rows, columns, width, height)
+        if self.pool is not None:
+            self.figure, self.axes, self._specs, self._params = self.pool.acquire(*self.key) #--- reuse a figure
+        else:
+            import matplotlib.pyplot as plt
+            
+            self.figure, self.axes = plt.subplots(rows,
+                                                  columns,
+                                                  figsize=(width * columns,
+                                                           height * rows)
+                                                 )
+            self._specs            = [ ax.get_subplotspec() for ax in np.ravel(self.axes) ]
+            self._params           = subplot_params(self.figure)
         
     ######################################
     #                                    #
@@ -71,6 +293,7 @@ class Plot:
     #                                    #
     ######################################
     
+    @profiled()
     def save(self,
              filename,
              tight_layout=True,
@@ -99,13 +322,33 @@ class Plot:
         
         return self
         
+    def reset(self):
+        '''
+        Remove all plots from the current figure, keeping the figure, the axes and the canvas.
+        '''
+        
+        reset_figure(self.figure, self.axes, self._specs, self._params)
+        
+        return self
+        
     def close(self):
         '''
-        Close the current figure.
+        Close the current figure (or return it to the pool, if any: pooled figures are not shown).
         '''
         
+        if self.pool is not None:
+            self.pool.release(self.key,
+                              self.figure,
+                              self.axes,
+                              self._specs,
+                              self._params
+                             ) #---------------- return the figure to the pool
+            return
+        
+        import matplotlib.pyplot as plt
+        
         plt.show()
-        plt.close(self.figure) #--- close the current figure
+        plt.close(self.figure) #---------------- close the current figure
         
     def save_and_close(self,
                        filename,
@@ -138,6 +381,7 @@ class Plot:
     #                                    #
     ######################################
     
+    @profiled(rows=1)
     def series2D(self,
                  data,
                  axis=0,
@@ -220,6 +464,7 @@ class Plot:
             
         return self
             
+    @profiled(rows=lambda self, data, *args, **kwargs: nrows(data[0]))
     def scatter2D(self,
                   data,
                   axis=0,
@@ -326,6 +571,7 @@ class Plot:
             
         return self
     
+    @profiled(rows=1)
     def matrix(self,
                data,
                axis=0,
@@ -335,21 +581,32 @@ class Plot:
                label=None,
                vmin=-1.0,
                vmax=1.0,
+               resolution=None,
+               aggregate='mean',
+               max_ticks=None,
+               rasterized=None,
                **kwargs):
         '''
         Plot matrix entries.
 
         Required arguments:
-            data:     the matrix to plot.
+            data:       the matrix to plot.
 
         Optional arguments:
-            axis:     the id of the axis to use for the plot,
-            xticks:   the name of the entries in the columns of the matrix,
-            yticks:   the name of the entries in the rows of the matrix,
-            label:    the label to use for the colour bar axis,
-            vmin:     minimum value in the colour bar,
-            vmax:     maximum value in the colour bar,
-            **kwargs: additional arguments to pass to plt.matshow
+            axis:       the id of the axis to use for the plot,
+            xticks:     the name of the entries in the columns of the matrix,
+            yticks:     the name of the entries in the rows of the matrix,
+            label:      the label to use for the colour bar axis,
+            vmin:       minimum value in the colour bar,
+            vmax:       maximum value in the colour bar,
+            resolution: the maximum number of displayed entries per side (larger matrices are block-aggregated),
+                        'auto' for the size of the axis in pixels (about one entry per pixel with the default equal
+                        aspect), None for no aggregation,
+            aggregate:  the aggregation of the blocks ('mean', 'max', 'min' or 'absmax'),
+            max_ticks:  the maximum number of ticks per axis (0: no thinning, default: as many labels as fit in the axis,
+                        only for aggregated matrices or with more than 1000 entries per side),
+            rasterized: whether to rasterize the matrix in vector output (default: only for aggregated matrices),
+            **kwargs:   additional arguments to pass to plt.imshow
         '''
 
         # choose the axis
@@ -358,25 +615,62 @@ class Plot:
         else: #----------------------------------------------- if only one axis
             ax = self.axes
 
+        if max_ticks is not None and max_ticks < 0:
+            raise ValueError('The maximum number of ticks must be non negative (0: no thinning).')
+
+        # reduce the matrix to the display resolution
+        rows, cols   = np.shape(data)
+        image        = data
+        prows, pcols = rows, cols #--------------------------- size covered by the image (including padding)
+        if resolution == 'auto':
+            box        = ax.get_window_extent() #------------- size of the axis (in pixels)
+            scale      = min(box.width / max(cols, 1), box.height / max(rows, 1)) #--- pixels per entry
+            resolution = max(1, int(max(rows, cols) * scale))
+        if resolution is not None:
+            image = block_reduce(data,
+                                 resolution=resolution,
+                                 aggregate=aggregate
+                                ) #--------------------------- aggregate blocks of entries
+            prows = np.shape(image)[0] * max(1, int(np.ceil(rows / resolution)))
+            pcols = np.shape(image)[1] * max(1, int(np.ceil(cols / resolution)))
+        aggregated = np.shape(image) != (rows, cols)
+        if rasterized is None:
+            rasterized = aggregated #------------------------- rasterize only aggregated matrices
+
         # preparation
         ax.grid(alpha=0.2) #---------------------------------- create the grid
         ax.set_title(title) #--------------------------------- set the title
-        ax.set_xticks(range(np.shape(data)[1])) #------------- set ticks of the x axis
-        ax.set_yticks(range(np.shape(data)[0])) #------------- set ticks of the x axis
+        if max_ticks is None and (aggregated or max(rows, cols) > 1000):
+            from matplotlib import rcParams
+
+            box       = ax.get_window_extent().transformed(ax.figure.dpi_scale_trans.inverted()) #--- size in inches
+            per_inch  = 72 / (1.2 * rcParams['font.size']) #-------------------------------------- labels per inch
+            xmax      = max(1, int(box.width * per_inch))
+            ymax      = max(1, int(box.height * per_inch))
+        else:
+            xmax = ymax = max_ticks or max(rows, cols, 1) #--- no thinning
+        xstep = max(1, int(np.ceil(cols / xmax))) #----------- thin the ticks
+        ystep = max(1, int(np.ceil(rows / ymax)))
+        ax.set_xticks(range(0, cols, xstep)) #---------------- set ticks of the x axis
+        ax.set_yticks(range(0, rows, ystep)) #---------------- set ticks of the y axis
         if xticks is not None:
-            ax.set_xticklabels(xticks,
+            ax.set_xticklabels(list(xticks)[::xstep],
                                ha='right',
                                va='top',
                                rotation=45) #----------------- set the name of the ticks on the x axis
         if yticks is not None:
-            ax.set_yticklabels(yticks) #---------------------- set the name of the ticks on the y axis
+            ax.set_yticklabels(list(yticks)[::ystep]) #------- set the name of the ticks on the y axis
 
         # plot the matrix
-        matshow = ax.imshow(data,
+        matshow = ax.imshow(image,
                             vmin=vmin,
                             vmax=vmax,
+                            extent=(-0.5, pcols - 0.5, prows - 0.5, -0.5),
+                            rasterized=rasterized,
                             **kwargs
-                           ) #-------------------------------- show the matrix
+                           ) #-------------------------------- show the matrix (in the original coordinates)
+        ax.set_xlim(-0.5, cols - 0.5) #----------------------- hide the padding of the blocks
+        ax.set_ylim(rows - 0.5, -0.5)
         cbar = ax.figure.colorbar(matshow,
                                   ax=ax,
                                   fraction=0.05,
@@ -388,6 +682,7 @@ class Plot:
 
         return self
     
+    @profiled(rows=1)
     def hist2D(self,
                data,
                axis=0,
@@ -455,6 +750,7 @@ class Plot:
 
         return self
     
+    @profiled(rows=1)
     def fplot2D(self,
                 data,
                 function,
@@ -0,0 +1,380 @@
+import inspect
+import logging
+import math
+import threading
+import tracemalloc
+
+from functools import wraps
+from time import perf_counter, process_time
+
+# the instrumentation is disabled by default: instrumented functions only pay for a global lookup
+_enabled = False
+_memory  = False
+_started = False #--- whether tracemalloc was started by this module
+_stats   = {}
+_active  = [] #------ running timers (the peak of tracemalloc is global: it is shared by nested timers)
+_lock    = threading.Lock()
+
+def enable(memory=False):
+    '''
+    Enable the instrumentation.
+
+    Optional arguments:
+        memory: whether to record the peak memory allocated by each call (uses tracemalloc, which is slow).
+    '''
+
+    global _enabled, _memory, _started
+
+    _memory = memory
+    if _memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        _started = True
+    _enabled = True
+
+def disable():
+    '''
+    Disable the instrumentation (the recorded statistics are kept).
+
+    Tracing of the memory is stopped only if it was started by enable.
+    '''
+
+    global _enabled, _memory, _started
+
+    _enabled = False
+    if _started and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    _started = False
+    _memory  = False
+
+def is_enabled():
+    '''
+    Returns:
+        whether the instrumentation is enabled.
+    '''
+
+    return _enabled
+
+def reset():
+    '''
+    Delete the recorded statistics.
+    '''
+
+    with _lock:
+        _stats.clear()
+
+def nrows(data):
+    '''
+    Compute the number of rows of the data.
+
+    Required arguments:
+        data: the data (array, dataframe, series or sequence).
+
+    Returns:
+        the number of rows (None if not available).
+    '''
+
+    if isinstance(data, str): #--- e.g. the path of a file
+        return None
+
+    shape = getattr(data, 'shape', None)
+    if shape:
+        return shape[0]
+    try:
+        return len(data)
+    except TypeError:
+        return None
+
+class Stat:
+    '''
+    Aggregate statistics of the calls of an instrumented function or section.
+
+    Attributes:
+        calls:     the number of calls,
+        wall:      the total wall time (in s),
+        cpu:       the total CPU time of the process (in s),
+        rows:      the total number of rows processed,
+        peak:      the largest peak memory allocated by a call (in bytes, only if memory is recorded),
+        wall_min:  the shortest wall time (in s),
+        wall_max:  the longest wall time (in s),
+        histogram: number of calls per wall time bin (bin k contains times in [2^k, 2^(k+1)) us).
+    '''
+
+    __slots__ = ('calls', 'wall', 'cpu', 'rows', 'peak', 'wall_min', 'wall_max', 'histogram')
+
+    def __init__(self):
+        '''
+        Constructor of the class.
+        '''
+
+        self.calls     = 0
+        self.wall      = 0.0
+        self.cpu       = 0.0
+        self.rows      = 0
+        self.peak      = 0
+        self.wall_min  = math.inf
+        self.wall_max  = 0.0
+        self.histogram = {}
+
+    def add(self, wall, cpu, rows, allocated):
+        '''
+        Add a call to the statistics.
+
+        Required arguments:
+            wall:      the wall time (in s),
+            cpu:       the CPU time (in s),
+            rows:      the number of rows processed (or None),
+            allocated: the peak memory allocated (in bytes).
+        '''
+
+        self.calls    += 1
+        self.wall     += wall
+        self.cpu      += cpu
+        self.rows     += rows or 0
+        self.peak      = max(self.peak, allocated)
+        self.wall_min  = min(self.wall_min, wall)
+        self.wall_max  = max(self.wall_max, wall)
+
+        k = int(math.log2(wall * 1e6)) if wall >= 1e-6 else 0 #--- logarithmic bins of microseconds
+        self.histogram[k] = self.histogram.get(k, 0) + 1
+
+    def quantile(self, q):
+        '''
+        Estimate a quantile of the wall time from the histogram.
+
+        Required arguments:
+            q: the quantile (between 0 and 1).
+
+        Returns:
+            the upper edge of the bin containing the quantile (in s).
+        '''
+
+        target = q * self.calls
+        total  = 0
+        for k in sorted(self.histogram):
+            total += self.histogram[k]
+            if total >= target:
+                return min(2.0 ** (k + 1) * 1e-6, self.wall_max)
+
+        return self.wall_max
+
+class Timer:
+    '''
+    Measure the resources used by a block of code, possibly over several segments.
+
+    The memory is the peak of the memory traced by tracemalloc above its value at the start of a segment
+    (the largest over the segments): memory allocated and released within the block is counted.
+
+    Public methods:
+        start: start (or resume) the measurement,
+        stop:  pause the measurement,
+        done:  record the measurement under the name of the timer.
+    '''
+
+    __slots__ = ('name', 'rows', 'wall', 'cpu', 'allocated', '_wall', '_cpu', '_mem', '_peak')
+
+    def __init__(self, name, rows=None):
+        '''
+        Constructor of the class.
+
+        Required arguments:
+            name: the name of the measurement.
+
+        Optional arguments:
+            rows: the number of rows processed.
+        '''
+
+        self.name      = name
+        self.rows      = rows
+        self.wall      = 0.0
+        self.cpu       = 0.0
+        self.allocated = 0
+
+    def __enter__(self):
+
+        return self.start()
+
+    def __exit__(self, *args):
+
+        self.stop()
+        self.done()
+
+    def start(self):
+        '''
+        Start (or resume) the measurement.
+        '''
+
+        if _memory:
+            self._mem, peak = tracemalloc.get_traced_memory()
+            self._peak      = self._mem
+            for timer in _active: #---------------------------------------- keep the peaks of the enclosing timers
+                timer._peak = max(timer._peak, peak)
+            tracemalloc.reset_peak()
+            _active.append(self)
+        self._cpu  = process_time()
+        self._wall = perf_counter()
+
+        return self
+
+    def stop(self):
+        '''
+        Pause the measurement.
+        '''
+
+        self.wall += perf_counter() - self._wall
+        self.cpu  += process_time() - self._cpu
+        if self in _active:
+            _active.remove(self)
+            peak           = max(self._peak, tracemalloc.get_traced_memory()[1])
+            self.allocated = max(self.allocated, peak - self._mem)
+
+    def done(self):
+        '''
+        Record the measurement.
+        '''
+
+        with _lock:
+            stat = _stats.get(self.name)
+            if stat is None:
+                stat = _stats[self.name] = Stat()
+            stat.add(self.wall, self.cpu, self.rows, self.allocated)
+
+class _NullSection:
+    '''
+    Section doing nothing (used when the instrumentation is disabled).
+    '''
+
+    __slots__ = ()
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, *args):
+
+        return False
+
+_NULL = _NullSection()
+
+def section(name, rows=None):
+    '''
+    Context manager measuring a block of code.
+
+    E.g.:
+        with section('load', rows=len(df)):
+            ...
+
+    Required arguments:
+        name: the name of the section.
+
+    Optional arguments:
+        rows: the number of rows processed.
+
+    Returns:
+        the context manager.
+    '''
+
+    return Timer(name, rows) if _enabled else _NULL
+
+def profiled(name=None, rows=None):
+    '''
+    Decorator measuring each call of a function (generators are measured while producing items).
+
+    Optional arguments:
+        name: the name of the measurement (default: the qualified name of the function),
+        rows: the number of rows processed, either the position of the argument whose rows are counted or
+              a function of the arguments of the call.
+
+    Returns:
+        the decorator.
+    '''
+
+    def count(args, kwargs):
+        if rows is None:
+            return None
+        if callable(rows):
+            return rows(*args, **kwargs)
+        return nrows(args[rows]) if rows < len(args) else None
+
+    def decorator(func):
+        label = name or func.__qualname__
+
+        if inspect.isgeneratorfunction(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                if not _enabled:
+                    return (yield from func(*args, **kwargs))
+                timer = Timer(label, count(args, kwargs))
+                gen   = func(*args, **kwargs)
+                try:
+                    while True:
+                        timer.start()
+                        try:
+                            item = next(gen)
+                        except StopIteration as stop:
+                            return stop.value
+                        finally:
+                            timer.stop() #--- exclude the time spent by the consumer
+                        yield item
+                finally:
+                    gen.close()
+                    timer.done()
+        else:
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                if not _enabled:
+                    return func(*args, **kwargs)
+                with Timer(label, count(args, kwargs)):
+                    return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+def stats():
+    '''
+    Returns:
+        a dictionary with the statistics (Stat) of each instrumented function or section.
+    '''
+
+    with _lock:
+        return dict(_stats)
+
+def report():
+    '''
+    Build a summary table of the recorded statistics (sorted by total wall time).
+
+    Returns:
+        the table (string).
+    '''
+
+    header = '{:<32s} {:>8s} {:>10s} {:>10s} {:>10s} {:>10s} {:>10s} {:>12s} {:>12s}'.format(
+                 'name', 'calls', 'wall [s]', 'cpu [s]', 'mean [ms]', 'p95 [ms]', 'max [ms]', 'rows/s', 'peak [MB]')
+    lines  = [header, '-' * len(header)]
+    for key, s in sorted(stats().items(), key=lambda item: -item[1].wall):
+        rate = '{:>12.4g}'.format(s.rows / s.wall) if s.rows and s.wall > 0 else '{:>12s}'.format('-')
+        lines.append('{:<32s} {:>8d} {:>10.4f} {:>10.4f} {:>10.3f} {:>10.3f} {:>10.3f} {} {:>12.3f}'.format(
+                         key[:32],
+                         s.calls,
+                         s.wall,
+                         s.cpu,
+                         1e3 * s.wall / s.calls,
+                         1e3 * s.quantile(0.95),
+                         1e3 * s.wall_max,
+                         rate,
+                         s.peak / 1024 / 1024))
+
+    return '\n'.join(lines)
+
+def dump(log, level=logging.INFO):
+    '''
+    Write the summary table to a log (e.g. created by create_logfile).
+
+    Required arguments:
+        log:   the log.
+
+    Optional arguments:
+        level: the level of the records.
+    '''
+
+    for line in report().splitlines():
+        log.log(level, line)
@@ -1,5 +1,6 @@
-import numpy  as np
-import pandas as pd
+import numpy as np
+
+from .libprof import profiled
 
 class Score:
     '''
@@ -12,6 +13,7 @@ class Score:
         error2:   returns the squared difference between the true values and the predictions
     '''
     
+    @profiled(rows=1)
     def __init__(self,
                  y_true,
                  y_pred,
@@ -34,6 +36,7 @@ class Score:
         # process the predictions
         self.y_pred   = np.array(self.rounding(y_pred)) if self.rounding is not None else np.array(y_pred)
         
+    @profiled(rows=lambda self: np.shape(self.y_true)[0])
     def correct(self):
         '''
         Compute the number of correct predictions.
@@ -108,6 +111,8 @@ class ViewCV:
             a Pandas dataframe with the cross-validation results.
         '''
         
+        import pandas as pd #--- imported on first use to keep the import of the module fast
+        
         return pd.DataFrame(self.estimator.cv_results_)
     
     def best_results(self):
@@ -2,6 +2,151 @@ import numpy as np
 
 from sklearn.base import BaseEstimator, TransformerMixin
 
+from .libprof import profiled
+
+# Arrow and Parquet input (PyArrow is only imported when such input is used)
+def is_arrow(X):
+    '''
+    Check whether the input is an Arrow object (array, chunked array, table or record batch).
+
+    Required arguments:
+        X: the input.
+
+    Returns:
+        True if the input is an Arrow object.
+    '''
+
+    return type(X).__module__.split('.')[0] == 'pyarrow'
+
+def is_parquet(X):
+    '''
+    Check whether the input is the path of a Parquet file (or dataset).
+
+    Required arguments:
+        X: the input.
+
+    Returns:
+        True if the input is a path.
+    '''
+
+    return isinstance(X, str)
+
+def _arrow_column(X, column=None):
+    '''
+    Select a column of an Arrow table or record batch (arrays are returned as they are).
+    '''
+
+    if hasattr(X, 'column_names'):
+        if column is None:
+            if X.num_columns != 1:
+                raise ValueError('The input has ' + str(X.num_columns) + ' columns: select one with "column".')
+            return X.column(0)
+        return X.column(column)
+
+    return X
+
+def _arrow_chunks(X):
+    '''
+    Iterate over the contiguous arrays of an Arrow array or chunked array.
+    '''
+
+    return X.chunks if hasattr(X, 'chunks') else [X]
+
+def _arrow_levels(array):
+    '''
+    Iterate over the nested list levels of an Arrow array, using the offsets buffers without copies.
+
+    Required arguments:
+        array: the Arrow array (list, large list or fixed size list of ... of numbers).
+
+    Yields:
+        the offsets of each level (as a NumPy array, starting from offsets[0]) and the values they index.
+    '''
+
+    import pyarrow as pa
+
+    while pa.types.is_list(array.type) or pa.types.is_large_list(array.type) or pa.types.is_fixed_size_list(array.type):
+        if pa.types.is_fixed_size_list(array.type):
+            size    = array.type.list_size
+            offsets = (np.arange(len(array) + 1) + array.offset) * size
+        else:
+            offsets = array.offsets.to_numpy() #--- zero-copy view of the offsets buffer
+        array = array.values.slice(offsets[0], offsets[-1] - offsets[0]) #--- children of the entries (no copy)
+        yield offsets, array
+
+def arrow_shape(X):
+    '''
+    Compute the shape of the largest entry of a nested list Arrow array (the shape of the padded tensor).
+
+    Required arguments:
+        X: the Arrow array or chunked array.
+
+    Returns:
+        the shape of the tensor.
+    '''
+
+    shape = []
+    for chunk in _arrow_chunks(X):
+        for i, (offsets, _) in enumerate(_arrow_levels(chunk)):
+            longest = int(np.diff(offsets).max()) if len(offsets) > 1 else 0
+            if i < len(shape):
+                shape[i] = max(shape[i], longest)
+            else:
+                shape.append(longest)
+
+    return tuple(shape)
+
+def arrow_dense(X, shape, out=None):
+    '''
+    Scatter the values of a nested list Arrow array into a dense (zero padded) tensor.
+
+    The values and offsets buffers are used directly: no Python object is created for the rows. Null
+    values are filled with zeros and null lists are treated as empty (as the padding).
+
+    Required arguments:
+        X:     the Arrow array (list, large list or fixed size list, possibly nested),
+        shape: the shape of the tensor of each row.
+
+    Optional arguments:
+        out:   the output array (of shape (rows,) + shape), filled in place.
+
+    Returns:
+        the dense tensor.
+    '''
+
+    size    = int(np.prod(shape)) if len(shape) > 0 else 1
+    strides = [ int(np.prod(shape[i + 1:])) for i in range(len(shape)) ]
+
+    # linear index (in the output) of each entry of the current level
+    index = np.arange(len(X), dtype=np.int64) * size
+    keep  = None #----------------------------------------------------- entries not inside a null list
+    data  = X
+    for level, (offsets, values) in enumerate(_arrow_levels(X)):
+        start    = offsets[0]
+        counts   = np.diff(offsets)
+        if data.null_count > 0: #------------------------------------- null lists may still span children
+            valid = data.is_valid().to_numpy(zero_copy_only=False)
+            keep  = valid if keep is None else keep & valid
+        longest  = (counts if keep is None else counts[keep]).max(initial=0)
+        if longest > shape[level]:
+            raise ValueError('An entry of the input is larger than the requested shape ' + str(tuple(shape)) + '.')
+        owner    = np.repeat(np.arange(len(counts)), counts) #-------- entry of the level owning each child
+        position = np.arange(offsets[-1] - start) - (offsets[:-1] - start)[owner]
+        index    = index[owner] + position * strides[level]
+        keep     = keep[owner] if keep is not None else None
+        data     = values
+
+    if data.null_count > 0:
+        data = data.fill_null(0) #------------------------------------- otherwise cast to garbage (e.g. NaN to int)
+    values = data.to_numpy(zero_copy_only=False) #--------------------- zero-copy for numbers without nulls
+    if keep is not None:
+        index, values = index[keep], values[keep]
+    if out is None:
+        out = np.zeros((len(X),) + tuple(shape), dtype=values.dtype)
+    out.reshape(-1)[index] = values
+
+    return out
+
 # remove the outliers from a Pandas dataset
 class RemoveOutliers(BaseEstimator, TransformerMixin):
     '''
@@ -9,6 +154,9 @@ class RemoveOutliers(BaseEstimator, TransformerMixin):
     
     E.g.: if the two classes are 'h11' and 'h21', the dictionary will be: {'h11': [1, 16], 'h21': [1, 86]}.
     
+    The dataset can also be an Arrow table or the path of a Parquet file (only the row groups which may
+    contain rows inside the intervals are read).
+    
     Public methods:
         fit:           unused method,
         transform:     remove data outside the given interval,
@@ -32,31 +180,57 @@ class RemoveOutliers(BaseEstimator, TransformerMixin):
 
         return self
 
+    @profiled(rows=1)
     def transform(self, X):
         '''
         Transform the input by deleting data outside the interval.
         
         Required arguments:
-            X: the dataset.
+            X: the dataset (Pandas dataframe, Arrow table or path of a Parquet file).
             
         Returns:
-            the transformed dataset.
+            the transformed dataset (an Arrow table for Arrow and Parquet input).
         '''
 
-        x = X.copy() #-------------------------------------------- avoid overwriting
+        if is_parquet(X):
+            import pyarrow.parquet as pq
+
+            filters = [ f for key, (low, high) in (self.filter_dict or {}).items()
+                          for f in [(key, '>=', low), (key, '<=', high)] ]
+            return pq.read_table(X, filters=filters or None) #----------------- skip row groups using their statistics
+
+        if is_arrow(X):
+            import pyarrow.compute as pc
+
+            if self.filter_dict is None:
+                return X
+            mask = None
+            for key, (low, high) in self.filter_dict.items():
+                keep = pc.and_(pc.greater_equal(X[key], low), pc.less_equal(X[key], high))
+                mask = keep if mask is None else pc.and_(mask, keep)
+            return X.filter(mask) #-------------------------------------------- Arrow arrays are immutable: no copy needed
+
+        if self.filter_dict is None:
+            return X.copy() #------------------------------------------------ avoid overwriting
 
-        if self.filter_dict is not None:
-            for key in self.filter_dict:
-                x = x.loc[x[key] >= self.filter_dict[key][0]] #--- keep only if > then smallest value
-                x = x.loc[x[key] <= self.filter_dict[key][1]] #--- keep only if < then largest value
+        # build the mask of the rows to keep (the dataset is copied only once)
+        mask = np.ones(np.shape(X)[0], dtype=bool)
+        for key in self.filter_dict:
+            low, high = self.filter_dict[key]
+            values    = X[key].values
+            mask     &= (values >= low) & (values <= high) #--- keep only if inside the interval
 
-        return x
+        return X.loc[mask]
 
 # extract the tensors from a Pandas dataset
 class ExtractTensor(BaseEstimator, TransformerMixin):
     '''
     Extract a dense tensor from sparse input from a given dataset.
     
+    The dataset can also be an Arrow (chunked) array of nested lists, an Arrow table or the path of a
+    Parquet file: the tensor is then filled directly from the values and offsets buffers, one chunk
+    (or row group) at a time.
+    
     Public methods:
         fit:           unused method,
         transform:     extract dense tensor,
@@ -64,17 +238,23 @@ class ExtractTensor(BaseEstimator, TransformerMixin):
         get_shape:     compute the shape of the tensor.
     '''
 
-    def __init__(self, flatten=False, shape=None):
+    def __init__(self, flatten=False, shape=None, chunk_size=None, n_jobs=None, column=None):
         '''
         Constructor of the class.
         
         Optional arguments:
-            flatten: whether to flatten the output or keep the current shape,
-            shape:   force the computation with a given shape.
+            flatten:    whether to flatten the output or keep the current shape,
+            shape:      force the computation with a given shape,
+            chunk_size: the number of rows processed at once (Pandas input only),
+            n_jobs:     the number of parallel jobs processing the chunks (Pandas input only, -1 for all CPUs),
+            column:     the column to read from Arrow tables and Parquet files.
         '''
 
-        self.flatten = flatten
-        self.shape   = shape
+        self.flatten    = flatten
+        self.shape      = shape
+        self.chunk_size = chunk_size
+        self.n_jobs     = n_jobs
+        self.column     = column
 
     def fit(self, X, y=None):
         '''
@@ -83,29 +263,119 @@ class ExtractTensor(BaseEstimator, TransformerMixin):
 
         return self
 
+    @profiled(rows=1)
     def transform(self, X):
         '''
         Compute the dense equivalent of the sparse input.
         
         Required arguments:
-            X: the dataset
+            X: the dataset (Pandas series, Arrow array or table, or path of a Parquet file)
             
         Returns:
             the transformed input.
         '''
 
-        x = X.copy() #----------------------------------------------------- avoid overwriting
+        if is_parquet(X) or is_arrow(X):
+            output = self._arrow(X)
+            if self.flatten and len(self.shape) > 0:
+                output = output.reshape(output.shape[0], -1)
+            return list(output) #------------------------------------------ views of the output (no copies)
+
+        x = X #------------------------------------------------------------ the input is never modified
         if self.shape is None:
             self.shape = x.apply(np.shape).max() #------------------------- get the shape of the tensor
 
+        # split the input in chunks
+        rows   = np.shape(x)[0]
+        n_jobs = self.n_jobs or 1
+        if n_jobs < 0:
+            from joblib import effective_n_jobs
+
+            n_jobs = effective_n_jobs(n_jobs) #-------------------------------- e.g. -1 for all CPUs
+        step   = self.chunk_size or (int(np.ceil(rows / n_jobs)) if n_jobs > 1 else rows)
+        if step <= 0 or step >= rows:
+            return list(self._dense(x))
+        chunks = (x.iloc[i:i + step] for i in range(0, rows, step))
+
+        # process the chunks in parallel (one chunk in flight per worker, results consumed as they come)
+        if n_jobs != 1:
+            from joblib import Parallel, delayed
+
+            denses = Parallel(n_jobs=n_jobs, pre_dispatch='n_jobs', return_as='generator')(delayed(self._dense)(c) for c in chunks)
+        else:
+            denses = map(self._dense, chunks)
+
+        # fill the output chunk by chunk
+        output = None
+        for i, dense in enumerate(denses):
+            if output is None:
+                output = np.empty((rows,) + dense.shape[1:], dtype=dense.dtype)
+            output[i * step:i * step + dense.shape[0]] = dense
+
+        return list(output)
+
+    def _dense(self, x):
+        '''
+        Pad and stack the rows of the input.
+        
+        Required arguments:
+            x: the dataset.
+            
+        Returns:
+            the dense array.
+        '''
+
         if len(self.shape) > 0: #------------------------------------------ apply padding to vectors and tensors
             offset = lambda s : [ (0, self.shape[i] - np.shape(s)[i]) for i in range(len(self.shape)) ]
             x      = x.apply(lambda s: np.pad(s, offset(s), mode='constant'))
 
         if self.flatten and len(self.shape) > 0:
-            return list(np.stack(x.apply(np.ndarray.flatten).values))
+            return np.stack(x.apply(np.ndarray.flatten).values)
+        else:
+            return np.stack(x.values)
+
+    def _arrow(self, X):
+        '''
+        Fill the dense tensor from Arrow or Parquet input.
+        
+        Required arguments:
+            X: the Arrow array or table, or the path of a Parquet file.
+            
+        Returns:
+            the dense array.
+        '''
+
+        # iterate over the row groups of Parquet files (read only when needed)
+        if is_parquet(X):
+            import pyarrow.parquet as pq
+
+            pf     = pq.ParquetFile(X)
+            column = self.column if self.column is not None else pf.schema_arrow.names[0]
+            rows   = pf.metadata.num_rows
+            groups = lambda: ( pf.read_row_group(i, columns=[column]).column(0) for i in range(pf.num_row_groups) )
         else:
-            return list(np.stack(x.values))
+            data   = _arrow_column(X, self.column)
+            rows   = len(data)
+            groups = lambda: [data]
+
+        if self.shape is None:
+            shape = ()
+            for group in groups(): #------------------------------------------- extra pass (pass the shape to avoid it)
+                current = arrow_shape(group)
+                shape   = tuple(max(a, b) for a, b in zip(current, shape)) + current[len(shape):] + shape[len(current):]
+            self.shape = shape
+
+        output = None
+        start  = 0
+        for group in groups():
+            for chunk in _arrow_chunks(group):
+                if output is None:
+                    output = arrow_dense(chunk[:0], self.shape) #-------------- get the type of the values
+                    output = np.zeros((rows,) + tuple(self.shape), dtype=output.dtype)
+                arrow_dense(chunk, self.shape, out=output[start:start + len(chunk)])
+                start += len(chunk)
+
+        return output if output is not None else np.zeros((0,) + tuple(self.shape))
 
     def get_shape(self):
         '''
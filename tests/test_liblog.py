@@ -0,0 +1,132 @@
+import gzip
+import json
+import subprocess
+import sys
+
+from os import path
+
+import numpy as np
+import pytest
+
+from mltools import liblog
+from mltools.liblog import MetricsLog, close_logfile, create_logfile, read_metrics
+
+def test_create_logfile_background(tmp_path, capsys):
+
+    filename = str(tmp_path / 'run.log')
+    log      = create_logfile(filename, name='background', with_stdout=True, background=True, batch=4)
+    for i in range(10):
+        log.info('record %d', i)
+    close_logfile(log)
+
+    with open(filename) as f:
+        lines = f.read().splitlines()
+
+    assert len(lines) == 10
+    assert lines[-1].endswith('INFO ==> record 9')
+    assert capsys.readouterr().out.splitlines() == lines
+
+def test_create_logfile_background_exit_without_close(tmp_path):
+
+    filename = str(tmp_path / 'run.log')
+    script   = '''
+import sys
+from mltools.liblog import create_logfile
+log = create_logfile(sys.argv[1], background=True)
+for i in range(20000):
+    log.info('record %d', i)
+''' #--- the records still in the queue are written by the exit hook
+    subprocess.run([sys.executable, '-c', script, filename], check=True, cwd=path.dirname(path.dirname(liblog.__file__)))
+
+    with open(filename) as f:
+        lines = f.read().splitlines()
+
+    assert len(lines) == 20000
+    assert lines[-1].endswith('INFO ==> record 19999')
+
+def test_create_logfile_compresses_rotated_logs(tmp_path):
+
+    filename = str(tmp_path / 'run.log')
+    close_logfile(create_logfile(filename, name='first'))
+    log      = create_logfile(filename, name='second', compress=True)
+    close_logfile(log)
+    for thread in liblog._compressions:
+        thread.join()
+
+    assert len(list(tmp_path.glob('run.log_*.gz'))) == 1
+
+def test_metrics_rotation_and_compression(tmp_path):
+
+    filename = str(tmp_path / 'run.jsonl')
+    with MetricsLog(filename, buffer_size=10, max_bytes=500) as metrics:
+        for i in range(100):
+            metrics.write(step=i, loss=np.float32(i) / 2)
+    for thread in liblog._compressions:
+        thread.join()
+
+    assert len(list(tmp_path.glob('run.jsonl_*.gz'))) > 1
+
+    data = read_metrics(filename, as_frame=False)
+    assert np.array_equal(data['step'], np.arange(100))
+    assert np.allclose(data['loss'], np.arange(100) / 2)
+
+def test_read_metrics_ignores_other_logs(tmp_path):
+
+    with MetricsLog(str(tmp_path / 'run'), compress=False) as metrics:
+        metrics.write(step=1)
+    with MetricsLog(str(tmp_path / 'run_eval'), compress=False) as metrics:
+        metrics.write(step=-1)
+    with MetricsLog(str(tmp_path / 'run_eval'), compress=False) as metrics: #--- rotates run_eval
+        metrics.write(step=-2)
+
+    assert list(read_metrics(str(tmp_path / 'run'))['step']) == [1]
+
+def test_read_metrics_file_compressed_meanwhile(tmp_path, monkeypatch):
+
+    filename = str(tmp_path / 'run.jsonl')
+    rotated  = filename + '_20260101.000000.000000'
+    with gzip.open(rotated + '.gz', 'wt') as f:
+        f.write(json.dumps({'step': 0}) + '\n')
+    with open(filename, 'w') as f:
+        f.write(json.dumps({'step': 1}) + '\n')
+
+    # the uncompressed file was listed, then removed by the compression before being opened
+    monkeypatch.setattr(liblog, 'glob', lambda pattern: [rotated, rotated + '.gz'])
+
+    assert list(read_metrics(filename)['step']) == [0, 1]
+
+def test_metrics_exit_without_close(tmp_path):
+
+    filename = str(tmp_path / 'run.jsonl')
+    script   = '''
+import sys
+from mltools.liblog import MetricsLog
+metrics = MetricsLog(sys.argv[1], buffer_size=1000)
+for i in range(10):
+    metrics.write(step=i)
+''' #--- the buffered records are written by the exit hook
+    subprocess.run([sys.executable, '-c', script, filename], check=True, cwd=path.dirname(path.dirname(liblog.__file__)))
+
+    assert list(read_metrics(filename)['step']) == list(range(10))
+
+def test_read_metrics_truncated_last_line(tmp_path):
+
+    filename = str(tmp_path / 'run.jsonl')
+    with open(filename + '_20260101.000000.000000', 'w') as f:
+        f.write('{"a": 0}\n{"a": 1\n') #--- interrupted while writing a block
+    with open(filename, 'w') as f:
+        f.write('{"a": 2}\n')
+
+    with pytest.warns(UserWarning):
+        data = read_metrics(filename, as_frame=False)
+
+    assert list(data['a']) == [0, 2]
+
+def test_read_metrics_corrupted_line(tmp_path):
+
+    filename = str(tmp_path / 'run.jsonl')
+    with open(filename, 'w') as f:
+        f.write('{"a": 0}\n{"a": \n{"a": 2}\n')
+
+    with pytest.raises(json.JSONDecodeError):
+        read_metrics(filename)
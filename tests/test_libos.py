@@ -0,0 +1,159 @@
+import logging
+
+import pytest
+
+from mltools import libos
+
+GB = 1024**3
+
+@pytest.fixture
+def hierarchy(tmp_path, monkeypatch):
+    '''
+    Fake /proc/self and cgroup mounts: returns a function writing the files.
+    '''
+
+    proc = tmp_path / 'proc'
+    proc.mkdir()
+    monkeypatch.setattr(libos, 'PROC', str(proc))
+    monkeypatch.setattr(libos.psutil, 'virtual_memory', lambda: type('vmem', (), {'total': 64 * GB})())
+
+    def write(cgroup, mounts, files):
+        (proc / 'cgroup').write_text(cgroup)
+        (proc / 'mountinfo').write_text(''.join(
+            '{} 1 0:{} {} {} rw - {} {} {}\n'.format(30 + i, i, root, tmp_path / mount, fstype, fstype, options)
+            for i, (root, mount, fstype, options) in enumerate(mounts)))
+        for name, value in files.items():
+            (tmp_path / name).parent.mkdir(parents=True, exist_ok=True)
+            (tmp_path / name).write_text(value + '\n')
+
+    return write
+
+def test_cgroup_v2_tightest_parent(hierarchy):
+
+    hierarchy('0::/user.slice/job/task\n',
+              [('/', 'cgroup', 'cgroup2', 'rw')],
+              {'cgroup/user.slice/job/task/memory.max':     'max',
+               'cgroup/user.slice/job/task/memory.current': str(1 * GB),
+               'cgroup/user.slice/job/task/cpu.max':        'max 100000',
+               'cgroup/user.slice/job/memory.max':          str(4 * GB),
+               'cgroup/user.slice/job/memory.current':      str(3 * GB),
+               'cgroup/user.slice/job/cpu.max':             '400000 100000',
+               'cgroup/user.slice/memory.max':              str(8 * GB),
+               'cgroup/user.slice/cpu.max':                 '150000 100000'})
+
+    assert libos.cgroup_memory() == (4 * GB, 3 * GB)
+    assert libos.cgroup_cpus() == 1.5
+
+def test_cgroup_v2_namespace(hierarchy):
+
+    # inside a cgroup namespace the process is at the root of the mount
+    hierarchy('0::/\n',
+              [('/docker/abc', 'cgroup', 'cgroup2', 'rw')],
+              {'cgroup/memory.max': str(2 * GB), 'cgroup/memory.current': str(GB), 'cgroup/cpu.max': '200000 100000'})
+
+    assert libos.cgroup_memory() == (2 * GB, GB)
+    assert libos.cgroup_cpus() == 2.0
+
+def test_cgroup_v1(hierarchy):
+
+    hierarchy('5:memory:/docker/abc\n4:cpu,cpuacct:/docker/abc\n0::/\n',
+              [('/', 'memory', 'cgroup', 'rw,memory'),
+               ('/', 'cpu,cpuacct', 'cgroup', 'rw,cpu,cpuacct'),
+               ('/', 'unified', 'cgroup2', 'rw')],
+              {'memory/docker/abc/memory.limit_in_bytes':   str(2**63 - 4096),
+               'memory/docker/abc/memory.usage_in_bytes':   str(GB),
+               'memory/docker/memory.limit_in_bytes':       str(6 * GB),
+               'memory/docker/memory.usage_in_bytes':       str(5 * GB),
+               'cpu,cpuacct/docker/abc/cpu.cfs_quota_us':   '250000',
+               'cpu,cpuacct/docker/abc/cpu.cfs_period_us':  '100000',
+               'cpu,cpuacct/docker/cpu.cfs_quota_us':       '-1',
+               'cpu,cpuacct/docker/cpu.cfs_period_us':      '100000'})
+
+    assert libos.cgroup_memory() == (6 * GB, 5 * GB)
+    assert libos.cgroup_cpus() == 2.5
+
+def test_cgroup_unlimited(hierarchy):
+
+    hierarchy('0::/task\n', [('/', 'cgroup', 'cgroup2', 'rw')], {'cgroup/task/memory.max': 'max', 'cgroup/task/cpu.max': 'max 100000'})
+
+    assert libos.cgroup_memory() is None
+    assert libos.cgroup_cpus() is None
+
+def test_info_os_within_limits():
+
+    info = libos.InfoOS()
+
+    assert 1 <= info.threads <= info.host_threads
+    assert 0 <= info.vmav <= info.vmtot <= info.host_vmtot
+
+def test_tune():
+
+    pd = pytest.importorskip('pandas')
+
+    from mltools.libtransformer import ExtractTensor, RemoveOutliers
+
+    info = type('info', (), {'threads': 4, 'vmav': 1024})()
+    data = pd.Series([ [1.0, 2.0] ] * 1000)
+    ext  = ExtractTensor()
+
+    params = libos.tune(ext, data, info=info)
+
+    assert params == {'n_jobs': 4, 'chunk_size': 250}
+    assert ext.n_jobs == 4 and ext.chunk_size == 250
+    assert libos.tune(RemoveOutliers({'a': [0, 10]}), pd.DataFrame({'a': range(10)}), info=info) == {}
+
+def test_tune_skips_arrow_and_parquet(tmp_path):
+
+    pa = pytest.importorskip('pyarrow')
+    pq = pytest.importorskip('pyarrow.parquet')
+
+    from mltools.libtransformer import ExtractTensor
+
+    table    = pa.table({'x': pa.array([[1, 2], [3]])})
+    filename = str(tmp_path / 'data.parquet')
+    pq.write_table(table, filename)
+    ext      = ExtractTensor()
+
+    assert libos.tune(ext, table) == {}
+    assert libos.tune(ext, filename) == {}
+    assert ext.n_jobs is None and ext.chunk_size is None
+
+def test_monitor_peak_between_samples():
+
+    np = pytest.importorskip('numpy')
+
+    mon    = libos.ResourceMonitor(interval=60)
+    before = mon.sample()
+    size   = int(max(mon.hwm - before.rss, 0) + 100) * 1024 * 1024 #--- above the previous high-water mark
+    with mon.stage('alloc'):
+        np.ones(size, dtype=np.uint8).sum() #--- released before the next sample
+    after  = mon.sample()
+
+    assert after.rss < before.rss + 100
+    assert after.peak >= before.rss + 0.9 * size / 1024 / 1024 #--- pages already resident may be reused
+    assert mon.peaks()['alloc'] >= before.rss + 0.9 * size / 1024 / 1024
+
+def test_monitor_one_sample_per_stage_transition(caplog):
+
+    mon = libos.ResourceMonitor(interval=60)
+    with mon.stage('load'):
+        pass
+
+    assert [ s.stage for s in mon.samples() ] == [None, 'load']
+
+    with caplog.at_level('INFO'):
+        mon.dump(logging.getLogger('monitor'))
+    assert caplog.records and all(r.levelname == 'INFO' for r in caplog.records)
+
+def test_monitor_without_io_access(monkeypatch):
+
+    mon = libos.ResourceMonitor(interval=60)
+
+    def denied():
+        raise libos.psutil.AccessDenied(mon.process.pid)
+
+    monkeypatch.setattr(mon.process, 'io_counters', denied, raising=False)
+    sample = mon.sample()
+
+    assert sample is not None and sample.rss > 0
+    assert sample.read is None and sample.write is None
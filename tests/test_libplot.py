@@ -0,0 +1,173 @@
+import numpy as np
+import pytest
+
+from mltools.libplot import block_reduce, correlation_matrix
+
+def test_correlation_matrix_matches_numpy():
+
+    data = np.random.default_rng(0).normal(size=(1000, 6))
+
+    assert np.allclose(correlation_matrix(data, chunk_size=77), np.corrcoef(data.T))
+
+@pytest.mark.parametrize('offset', [1e6, 1e8])
+def test_correlation_matrix_large_offset(offset):
+
+    data = np.random.default_rng(1).normal(size=(20000, 2)) + offset
+
+    assert np.allclose(correlation_matrix(data, chunk_size=1000), np.corrcoef(data.T), atol=1e-6)
+
+def test_correlation_matrix_memmap(tmp_path):
+
+    data = np.random.default_rng(2).normal(size=(500, 4))
+    np.save(tmp_path / 'x.npy', data)
+
+    assert np.allclose(correlation_matrix(str(tmp_path / 'x.npy'), chunk_size=64), np.corrcoef(data.T))
+
+def test_block_reduce():
+
+    data = np.arange(16.0).reshape(4, 4)
+
+    assert np.array_equal(block_reduce(data, 2), [[2.5, 4.5], [10.5, 12.5]])
+    assert np.array_equal(block_reduce(data, 2, aggregate='max'), [[5, 7], [13, 15]])
+    assert block_reduce(data, 4).shape == (4, 4)
+
+def test_block_reduce_unknown_aggregation():
+
+    with pytest.raises(ValueError):
+        block_reduce(np.eye(4), 2, aggregate='median')
+
+@pytest.fixture
+def plot():
+
+    matplotlib = pytest.importorskip('matplotlib')
+    matplotlib.use('Agg')
+
+    from mltools.libplot import Plot
+
+    plot = Plot()
+    yield plot
+    plot.close()
+
+def test_matrix_keeps_all_labels_of_small_matrices(plot):
+
+    labels = [ 'f' + str(i) for i in range(30) ]
+    plot.matrix(np.eye(30), xticks=labels, yticks=labels)
+
+    assert len(plot.axes.get_xticks()) == 30
+    assert [ t.get_text() for t in plot.axes.get_yticklabels() ] == labels
+
+@pytest.mark.parametrize('max_ticks', [0, False])
+def test_matrix_without_thinning(plot, max_ticks):
+
+    plot.matrix(np.eye(300), resolution=100, max_ticks=max_ticks)
+
+    assert len(plot.axes.get_xticks()) == 300
+
+def test_matrix_negative_max_ticks(plot):
+
+    with pytest.raises(ValueError):
+        plot.matrix(np.eye(10), max_ticks=-1)
+
+def test_matrix_aggregated_extent(plot):
+
+    plot.matrix(np.zeros((7, 1001)), resolution=500)
+    image = plot.axes.get_images()[0]
+
+    # 1001 columns in blocks of 3 entries: 334 blocks covering 1002 columns
+    assert image.get_array().shape == (7, 334)
+    assert image.get_extent() == [-0.5, 1001.5, 6.5, -0.5]
+    assert tuple(plot.axes.get_xlim()) == (-0.5, 1000.5)
+    assert image.get_rasterized()
+    assert len(plot.axes.get_xticks()) < 100
+
+def test_figure_pool_reuses_figures(tmp_path):
+
+    matplotlib = pytest.importorskip('matplotlib')
+    matplotlib.use('Agg')
+
+    import matplotlib.pyplot as plt
+
+    from mltools.libplot import FigurePool, Plot
+
+    pool    = FigurePool(size=2)
+    figures = set()
+    for epoch in range(3):
+        plot = Plot(columns=2, pool=pool)
+        plot.matrix(np.eye(5), axis=0)
+        plot.series2D(np.arange(10.0) * epoch, axis=1)
+        plot.save(str(tmp_path / ('epoch' + str(epoch))), extension='png')
+        figures.add(id(plot.figure))
+        plot.close()
+
+    assert len(figures) == 1
+    assert (tmp_path / 'epoch2.png').is_file()
+    assert len(pool) == 1
+    assert plt.get_fignums() == [] #--- pooled figures are not managed by pyplot
+
+    # the figure comes back without artists and without colour bars
+    plot = Plot(columns=2, pool=pool)
+    assert len(plot.figure.axes) == 2
+    assert not plot.axes[0].get_images() and not plot.axes[1].get_lines()
+
+def test_figure_pool_eviction():
+
+    pytest.importorskip('matplotlib')
+
+    from mltools.libplot import FigurePool, Plot
+
+    pool  = FigurePool(size=2)
+    plots = [ Plot(width=w, pool=pool) for w in (4, 5, 6) ]
+    for plot in plots:
+        plot.close()
+
+    assert list(pool.figures) == [(1, 1, 5, 5), (1, 1, 6, 5)]
+
+@pytest.mark.parametrize('columns', [1, 2])
+def test_figure_pool_renders_like_new_figure(tmp_path, columns):
+
+    matplotlib = pytest.importorskip('matplotlib')
+    matplotlib.use('Agg')
+
+    import matplotlib.image as mpimg
+
+    from mltools.libplot import FigurePool, Plot
+
+    data = np.random.default_rng(3).normal(size=(20, 20))
+
+    def draw(name, pool=None):
+        plot = Plot(columns=columns, pool=pool)
+        plot.matrix(data, axis=columns - 1)
+        plot.save(str(tmp_path / name), extension='png') #--- with the tight layout
+        plot.close()
+        return mpimg.imread(str(tmp_path / (name + '.png')))
+
+    reference = draw('new')
+    pool      = FigurePool()
+    for epoch in range(3):
+        assert np.array_equal(draw('pooled' + str(epoch), pool=pool), reference)
+
+    # the same holds for Plot.reset
+    plot = Plot(columns=columns)
+    for epoch in range(2):
+        plot.reset()
+        plot.matrix(data, axis=columns - 1)
+        plot.save(str(tmp_path / 'reset'), extension='png')
+        assert np.array_equal(mpimg.imread(str(tmp_path / 'reset.png')), reference)
+    plot.close()
+
+def test_matrix_auto_resolution(plot):
+
+    box = plot.axes.get_window_extent()
+    plot.matrix(np.random.default_rng(4).normal(size=(3000, 3000)), resolution='auto')
+    image = plot.axes.get_images()[0]
+
+    assert 1 < image.get_array().shape[0] <= min(box.width, box.height)
+    assert image.get_array().shape[0] >= min(box.width, box.height) / 2
+    assert tuple(plot.axes.get_xlim()) == (-0.5, 2999.5)
+
+def test_matrix_auto_resolution_small(plot):
+
+    plot.matrix(np.eye(30), resolution='auto')
+
+    assert plot.axes.get_images()[0].get_array().shape == (30, 30)
+    assert not plot.axes.get_images()[0].get_rasterized()
@@ -0,0 +1,89 @@
+import tracemalloc
+
+import numpy as np
+import pytest
+
+from mltools import libprof
+
+MB = 1024 * 1024
+
+@pytest.fixture
+def prof():
+
+    libprof.reset()
+    yield libprof
+    libprof.disable()
+    libprof.reset()
+
+def test_disabled_records_nothing(prof):
+
+    with prof.section('nothing'):
+        pass
+
+    assert prof.stats() == {}
+
+def test_profiled_function(prof):
+
+    @prof.profiled(rows=0)
+    def double(x):
+        return 2 * x
+
+    prof.enable()
+    for _ in range(3):
+        double(np.ones(10))
+
+    stat = prof.stats()[double.__qualname__]
+    assert stat.calls == 3 and stat.rows == 30
+    assert stat.wall_min <= stat.wall / 3 <= stat.wall_max
+    assert double.__qualname__[:32] in prof.report()
+
+def test_profiled_generator(prof):
+
+    @prof.profiled(name='gen', rows=lambda n: n)
+    def gen(n):
+        yield from range(n)
+
+    prof.enable()
+
+    assert list(gen(5)) == list(range(5))
+    assert prof.stats()['gen'].calls == 1 and prof.stats()['gen'].rows == 5
+
+def test_peak_memory_released_in_block(prof):
+
+    prof.enable(memory=True)
+    with prof.section('temporary'):
+        np.ones(10 * MB, dtype=np.uint8).sum() #--- allocated and released before the end of the block
+
+    assert prof.stats()['temporary'].peak >= 10 * MB
+
+def test_peak_memory_nested(prof):
+
+    prof.enable(memory=True)
+    with prof.section('outer'):
+        np.ones(8 * MB, dtype=np.uint8).sum()
+        with prof.section('inner'): #--- resets the peak of tracemalloc
+            np.ones(MB, dtype=np.uint8).sum()
+
+    assert prof.stats()['outer'].peak >= 8 * MB
+    assert MB <= prof.stats()['inner'].peak < 8 * MB
+
+def test_disable_keeps_tracing_started_by_user(prof):
+
+    tracemalloc.start()
+    try:
+        prof.enable(memory=True)
+        prof.disable()
+        assert tracemalloc.is_tracing()
+    finally:
+        tracemalloc.stop()
+
+    prof.enable(memory=True)
+    prof.disable()
+    assert not tracemalloc.is_tracing()
+
+def test_nrows():
+
+    assert libprof.nrows(np.zeros((4, 2))) == 4
+    assert libprof.nrows([1, 2, 3]) == 3
+    assert libprof.nrows('data.parquet') is None
+    assert libprof.nrows(None) is None
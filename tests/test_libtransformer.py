@@ -0,0 +1,166 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from mltools.libtransformer import ExtractTensor, RemoveOutliers
+
+ROWS = [ np.arange(r * c).reshape(r, c) + 1 for r, c in [(2, 3), (1, 1), (3, 2), (0, 0), (2, 2)] ]
+
+def dense(rows, shape=(3, 3)):
+    '''
+    Reference padded tensor of a list of matrices.
+    '''
+
+    out = np.zeros((len(rows),) + shape, dtype=np.int64)
+    for i, m in enumerate(rows):
+        if m is not None:
+            out[(i,) + tuple(slice(0, s) for s in np.shape(m))] = m
+
+    return out
+
+def nested(rows):
+    '''
+    Nested Python lists of a list of matrices.
+    '''
+
+    return [ None if m is None else [ list(r) for r in np.asarray(m).tolist() ] for m in rows ]
+
+def test_extract_tensor_pandas():
+
+    output = ExtractTensor(shape=(3, 3)).transform(pd.Series(ROWS))
+
+    assert np.array_equal(np.stack(output), dense(ROWS))
+
+@pytest.mark.parametrize('chunk_size, n_jobs', [(2, None), (None, 2), (2, -1)])
+def test_extract_tensor_pandas_chunks(chunk_size, n_jobs):
+
+    output = ExtractTensor(flatten=True, shape=(3, 3), chunk_size=chunk_size, n_jobs=n_jobs).transform(pd.Series(ROWS))
+
+    assert np.array_equal(np.stack(output), dense(ROWS).reshape(len(ROWS), -1))
+
+def test_extract_tensor_arrow_matches_pandas():
+
+    pa = pytest.importorskip('pyarrow')
+
+    reference = ExtractTensor(flatten=True, shape=(3, 3)).transform(pd.Series(ROWS))
+    output    = ExtractTensor(flatten=True).transform(pa.array(nested(ROWS)))
+
+    assert np.array_equal(np.stack(output), np.stack(reference))
+
+def test_extract_tensor_arrow_sliced():
+
+    pa = pytest.importorskip('pyarrow')
+
+    array = pa.array(nested(ROWS))[2:5] #--- offsets not starting from zero
+
+    assert np.array_equal(np.stack(ExtractTensor(shape=(3, 3)).transform(array)), dense(ROWS[2:5]))
+
+def test_extract_tensor_arrow_fixed_size_sliced():
+
+    pa = pytest.importorskip('pyarrow')
+
+    values = np.arange(24)
+    array  = pa.FixedSizeListArray.from_arrays(pa.FixedSizeListArray.from_arrays(pa.array(values), 3), 2)[1:3]
+
+    assert np.array_equal(np.stack(ExtractTensor().transform(array)), values.reshape(4, 2, 3)[1:3])
+
+def test_extract_tensor_arrow_chunked():
+
+    pa = pytest.importorskip('pyarrow')
+
+    array = pa.chunked_array([pa.array(nested(ROWS[:2])), pa.array(nested(ROWS[2:]))])
+
+    assert np.array_equal(np.stack(ExtractTensor(shape=(3, 3)).transform(array)), dense(ROWS))
+
+def test_extract_tensor_parquet_row_groups(tmp_path):
+
+    pa = pytest.importorskip('pyarrow')
+    pq = pytest.importorskip('pyarrow.parquet')
+
+    filename = str(tmp_path / 'data.parquet')
+    pq.write_table(pa.table({'id': np.arange(len(ROWS)), 'matrix': pa.array(nested(ROWS))}), filename, row_group_size=2)
+    assert pq.ParquetFile(filename).num_row_groups == 3
+
+    output = ExtractTensor(column='matrix').transform(filename)
+
+    assert np.array_equal(np.stack(output), dense(ROWS))
+
+def test_extract_tensor_arrow_nulls():
+
+    pa = pytest.importorskip('pyarrow')
+
+    rows   = [[[1, None], [3, 4]], None, [[5]], [None, [6, 7]]]
+    output = np.stack(ExtractTensor().transform(pa.array(rows)))
+
+    assert output.dtype == np.int64
+    assert np.array_equal(output, [[[1, 0], [3, 4]], [[0, 0], [0, 0]], [[5, 0], [0, 0]], [[0, 0], [6, 7]]])
+
+def test_extract_tensor_arrow_null_list_with_children():
+
+    pa = pytest.importorskip('pyarrow')
+
+    # the null entry spans children (allowed by the format): they must not be written
+    offsets = pa.array([0, 2, 4, 5], type=pa.int32())
+    array   = pa.ListArray.from_arrays(offsets, pa.array([1, 2, 3, 4, 5]), mask=pa.array([False, True, False]))
+
+    assert np.array_equal(np.stack(ExtractTensor().transform(array)), [[1, 2], [0, 0], [5, 0]])
+
+def test_extract_tensor_arrow_too_large():
+
+    pa = pytest.importorskip('pyarrow')
+
+    with pytest.raises(ValueError):
+        ExtractTensor(shape=(2, 2)).transform(pa.array(nested(ROWS)))
+
+FILTER = {'a': [1, 3], 'b': [0, 10]}
+
+@pytest.fixture
+def table():
+
+    rng = np.random.default_rng(0)
+
+    return pd.DataFrame({'a': rng.integers(0, 6, size=50), 'b': rng.integers(-5, 15, size=50)})
+
+def test_remove_outliers(table):
+
+    output = RemoveOutliers(FILTER).transform(table)
+    inside = table['a'].between(1, 3) & table['b'].between(0, 10)
+
+    assert output.equals(table[inside])
+
+def test_remove_outliers_arrow(table):
+
+    pa = pytest.importorskip('pyarrow')
+
+    output = RemoveOutliers(FILTER).transform(pa.Table.from_pandas(table, preserve_index=False))
+
+    assert output.to_pandas().equals(RemoveOutliers(FILTER).transform(table).reset_index(drop=True))
+
+def test_remove_outliers_parquet(table, tmp_path):
+
+    pa = pytest.importorskip('pyarrow')
+    pq = pytest.importorskip('pyarrow.parquet')
+
+    filename = str(tmp_path / 'data.parquet')
+    pq.write_table(pa.Table.from_pandas(table, preserve_index=False), filename, row_group_size=10)
+    output   = RemoveOutliers(FILTER).transform(filename)
+
+    assert output.to_pandas().equals(RemoveOutliers(FILTER).transform(table).reset_index(drop=True))
+
+def test_extract_tensor_all_cpus(monkeypatch):
+
+    joblib = pytest.importorskip('joblib')
+
+    calls = []
+
+    class Parallel(joblib.Parallel):
+        def __init__(self, n_jobs=None, **kwargs):
+            calls.append(n_jobs)
+            super().__init__(n_jobs=1, **kwargs)
+
+    monkeypatch.setattr(joblib, 'Parallel', Parallel)
+    monkeypatch.setattr(joblib, 'effective_n_jobs', lambda n_jobs: 2)
+    output = ExtractTensor(shape=(3, 3), n_jobs=-1).transform(pd.Series(ROWS))
+
+    assert calls == [2] #--- -1 is resolved to the number of CPUs instead of running serially
+    assert np.array_equal(np.stack(output), dense(ROWS))